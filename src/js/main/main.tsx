@@ -64,10 +64,7 @@ const Main = () => {
 
   useEffect(() => {
     runBatchFile();
-    if (waveSurfer && filePath) {
-      console.log('Loading path:', filePath);
-      waveSurfer.load(filePath);
-    }
+    // AudioWaveform loads filePath itself, with server-side peaks when it has them.
   }, [filePath, waveSurfer]);
 
   const saveBase64ToFile = (base64Data: string, filename: string) => {
@@ -444,6 +441,7 @@ const Main = () => {
                 handleFileChange={handleFileChange}
                 markers={markers}
                 setMarkers={setMarkers}
+                flaskClient={flaskClient}
               />
             </div>
           )}
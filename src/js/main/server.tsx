@@ -7,6 +7,9 @@ interface IsolationRequest {
     shifts: number;
     two_stems: string | null;
     output_folder: string;
+    segment_seconds?: number;
+    overlap_seconds?: number;
+    stem_format?: 'wav' | 'flac' | 'ogg' | 'mp3' | 'm4a';
 }
 
 function createIsolationRequest(
@@ -15,7 +18,10 @@ function createIsolationRequest(
     device: string,
     shifts: number,
     twoStems: string | null,
-    output_folder: string
+    output_folder: string,
+    segmentSeconds?: number,
+    overlapSeconds?: number,
+    stemFormat?: IsolationRequest['stem_format']
 ): IsolationRequest {
     if (twoStems === null) {
         twoStems = null;
@@ -26,7 +32,10 @@ function createIsolationRequest(
         device: device,
         shifts: shifts,
         two_stems: twoStems,
-        output_folder: output_folder
+        output_folder: output_folder,
+        segment_seconds: segmentSeconds,
+        overlap_seconds: overlapSeconds,
+        stem_format: stemFormat
     };
 }
 
@@ -36,6 +45,7 @@ interface BeatDetectionRequest {
     sr?: number;
     start_bpm?: number;
     tightness?: number;
+    stream?: boolean;
     output_folder: string;
 }
 
@@ -57,6 +67,25 @@ function createBeatDetectionRequest(
     };
 }
 
+interface WaveformPeaks {
+    duration: number;
+    sample_rate: number;
+    samples_per_peak: number;
+    level: number;
+    peaks: Float32Array;  // Interleaved [min, max, min, max, ...] in [-1, 1]
+}
+
+interface JobStatus {
+    job_id: string;
+    kind: string;
+    status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+    stage: string;
+    progress: number;
+    version: number;
+    error?: string;
+    result?: any;
+}
+
 class FlaskClient {
     private baseUrl: string;
 
@@ -64,10 +93,41 @@ class FlaskClient {
         this.baseUrl = baseUrl;
     }
 
-    async isolateAudio(data: IsolationRequest): Promise<string[]> {
+    async getHealth(): Promise<{ status: string; ready: boolean }> {
+        const response = await axios.get(`${this.baseUrl}/health`);
+        return response.data;
+    }
+
+    async waitForJob(jobId: string, onProgress?: (job: JobStatus) => void, timeoutSeconds: number = 30): Promise<any> {
+        // Long poll: the server answers as soon as the job changes after the last version seen.
+        let version = -1;
+        while (true) {
+            const response = await axios.get(`${this.baseUrl}/jobs/${jobId}`, {
+                params: { since: version, timeout: timeoutSeconds }
+            });
+            const job: JobStatus = response.data;
+            if (onProgress && job.version !== version) {
+                onProgress(job);
+            }
+            version = job.version;
+            if (job.status === 'completed') {
+                return job.result;
+            }
+            if (job.status === 'failed' || job.status === 'cancelled') {
+                throw new Error(job.error || `Job ${jobId} ${job.status}.`);
+            }
+        }
+    }
+
+    async cancelJob(jobId: string): Promise<void> {
+        await axios.delete(`${this.baseUrl}/jobs/${jobId}`);
+    }
+
+    async isolateAudio(data: IsolationRequest, onProgress?: (job: JobStatus) => void): Promise<string[]> {
         try {
             const response = await axios.post(`${this.baseUrl}/isolate`, data);
-            return response.data.output_files;  // Adjusted to return the output_files array
+            const result = await this.waitForJob(response.data.job_id, onProgress);
+            return result.output_files;  // Adjusted to return the output_files array
         } catch (error) {
             console.error("Error isolating audio:", JSON.stringify(error)   );
             alert("Error isolating audio:" + error);
@@ -75,10 +135,11 @@ class FlaskClient {
         }
     }
 
-    async detectBeats(data: BeatDetectionRequest): Promise<any> {
+    async detectBeats(data: BeatDetectionRequest, onProgress?: (job: JobStatus) => void): Promise<any> {
         try {
             const response = await axios.post(`${this.baseUrl}/beat-detection`, data);
-            return response.data.results;  // Adjusted to return the results array
+            const result = await this.waitForJob(response.data.job_id, onProgress);
+            return result.results;  // Adjusted to return the results array
         } catch (error) {
             console.error("Error detecting beats:", error);
             alert("Error detecting beats:" + error);
@@ -86,9 +147,41 @@ class FlaskClient {
         }
     }
 
-    async getProgress(): Promise<number> {
+    async detectBeatsBatch(data: Omit<BeatDetectionRequest, 'file_path'> & { file_paths: string[] },
+                           onProgress?: (job: JobStatus) => void): Promise<any> {
+        try {
+            const response = await axios.post(`${this.baseUrl}/beat-detection/batch`, data);
+            const result = await this.waitForJob(response.data.job_id, onProgress);
+            return result.results;
+        } catch (error) {
+            console.error("Error detecting beats:", error);
+            throw new Error("Failed to detect beats.");
+        }
+    }
+
+    async getPeaks(filePath: string, width: number): Promise<WaveformPeaks> {
+        const params = { file_path: filePath, width: Math.max(1, Math.round(width)) };
+        let response = await axios.get(`${this.baseUrl}/peaks`, { params, responseType: 'arraybuffer' });
+        if (response.status === 202) {
+            // Not built yet: the server queued a job for it.
+            const job = JSON.parse(new TextDecoder().decode(response.data));
+            await this.waitForJob(job.job_id);
+            response = await axios.get(`${this.baseUrl}/peaks`, { params, responseType: 'arraybuffer' });
+        }
+        const scale = Number(response.headers['x-peaks-scale'] || 127);
+        const peaks = Float32Array.from(new Int8Array(response.data), (value) => value / scale);
+        return {
+            duration: Number(response.headers['x-peaks-duration']),
+            sample_rate: Number(response.headers['x-peaks-sample-rate']),
+            samples_per_peak: Number(response.headers['x-peaks-samples-per-peak']),
+            level: Number(response.headers['x-peaks-level']),
+            peaks: peaks
+        };
+    }
+
+    async getProgress(jobId: string): Promise<number> {
         try {
-            const response = await axios.get(`${this.baseUrl}/progress`, {
+            const response = await axios.get(`${this.baseUrl}/progress?job_id=${jobId}`, {
                 responseType: 'stream'
             });
             let progress = 0;
@@ -115,3 +208,4 @@ class FlaskClient {
 }
 
 export { createIsolationRequest, createBeatDetectionRequest, FlaskClient };
+export type { JobStatus, WaveformPeaks };
@@ -6,6 +6,7 @@ import MinimapPlugin from 'wavesurfer.js/dist/plugins/minimap';
 import RegionsPlugin from 'wavesurfer.js/dist/plugins/regions';
 import { fs } from '../lib/cep/node';
 import { evalTS } from '../lib/utils/bolt';
+import { FlaskClient } from './server';
 import { ActionButton, Slider } from '@adobe/react-spectrum';
 import PlayIcon from '@spectrum-icons/workflow/Play';
 import PauseIcon from '@spectrum-icons/workflow/Pause';
@@ -25,6 +26,16 @@ interface AudioWaveformProps {
   handleFileChange: (file: File) => void;
   markers: any[];
   setMarkers: React.Dispatch<React.SetStateAction<any[]>>;
+  flaskClient?: FlaskClient;
+}
+
+// Peaks are requested for several times the visible width so zooming in keeps some detail.
+const PEAKS_ZOOM_HEADROOM = 8;
+
+interface LoadedPeaks {
+  url: string;
+  peaks: Float32Array[];
+  duration: number;
 }
 
 const AudioWaveform = forwardRef(({
@@ -37,6 +48,7 @@ const AudioWaveform = forwardRef(({
   handleFileChange,
   markers,
   setMarkers,
+  flaskClient,
 }: AudioWaveformProps, ref) => {
   const waveformRef = useRef<HTMLDivElement>(null);
   const timelineRef = useRef<HTMLDivElement>(null);
@@ -49,6 +61,7 @@ const AudioWaveform = forwardRef(({
   const [volume, setVolume] = useState(1);
   const [isMuted, setIsMuted] = useState(false);
   const [inpoint, setInPoint] = useState(0);
+  const peaksRef = useRef<LoadedPeaks | null>(null);
 
   const random = (min: number, max: number) => Math.random() * (max - min) + min;
   const randomColor = () => `rgba(${random(0, 255)}, ${random(0, 255)}, ${random(0, 255)}, 0.5)`;
@@ -156,9 +169,19 @@ const ws = WaveSurfer.create({
     };
   }, [setWaveSurfer]);
 
+  // With server-side peaks wavesurfer skips fetching and decoding the file; the media element streams it.
+  const loadAudio = (ws: WaveSurfer, url: string) => {
+    const loaded = peaksRef.current;
+    if (loaded && loaded.url === url) {
+      ws.load(url, loaded.peaks, loaded.duration);
+    } else {
+      ws.load(url);
+    }
+  };
+
   useEffect(() => {
     if (filePath && waveSurfer) {
-      waveSurfer.load(filePath);
+      loadAudio(waveSurfer, filePath);
       setIsFileLoaded(true);
     }
   }, [filePath, waveSurfer, setIsFileLoaded]);
@@ -322,16 +345,27 @@ const ws = WaveSurfer.create({
       const { path: audioPath, name: audioName, inPoint: inpoint } = info || {};
       if (audioPath) {
         try {
-          const fileBuffer = fs.readFileSync(audioPath);
-          const blob = new Blob([fileBuffer], { type: 'audio/wav' });
-          const url = URL.createObjectURL(blob);
+          let url: string;
+          try {
+            if (!flaskClient) {
+              throw new Error('No server client.');
+            }
+            const width = (waveformRef.current?.clientWidth || 1000) * (window.devicePixelRatio || 1);
+            const data = await flaskClient.getPeaks(audioPath, width * PEAKS_ZOOM_HEADROOM);
+            const normalized = audioPath.replace(/\\/g, '/');
+            url = encodeURI(`file://${normalized.startsWith('/') ? '' : '/'}${normalized}`);
+            peaksRef.current = { url, peaks: [data.peaks], duration: data.duration };
+          } catch (error) {
+            // Fall back to decoding the whole file in the panel.
+            console.warn('Waveform peaks unavailable, decoding in the panel:', error);
+            const fileBuffer = fs.readFileSync(audioPath);
+            const blob = new Blob([fileBuffer], { type: 'audio/wav' });
+            url = URL.createObjectURL(blob);
+          }
           setFilePath(url);
           setFileName(audioName); // Set the file name
           setIsFileLoaded(true);
           setInPoint(inpoint);
-          if (waveSurfer) {
-            waveSurfer.load(url);
-          }
         } catch (error) {
           console.error('Error loading audio file:', error);
         }
@@ -0,0 +1,183 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+import Metrics
+
+CHANNEL_LAYOUTS = {'mono': 1, 'stereo': 2, '2.1': 3, '3.0': 3, 'quad': 4, '4.0': 4, '4.1': 5, '5.0': 5,
+                   '5.1': 6, '6.0': 6, '6.1': 7, '7.0': 7, '7.1': 8}
+
+_AUDIO_STREAM = re.compile(r"Stream #\d+:\d+.*?: Audio: [^\n]*?(\d+) Hz, ([^,\n]+)")
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_CHANNELS = re.compile(r"(\d+) channels")
+
+
+def find_ffmpeg() -> Optional[str]:
+    """
+    Return the ffmpeg binary bundled next to this module, or the one on ``PATH``.
+
+    Returns:
+        Optional[str]: Path to ffmpeg, or None if it is not available.
+    """
+    for name in ('ffmpeg.exe', 'ffmpeg'):
+        bundled = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+        if os.path.isfile(bundled):
+            return bundled
+    return shutil.which('ffmpeg')
+
+
+def probe(file_path: str, ffmpeg: Optional[str] = None) -> Tuple[int, int, Optional[float]]:
+    """
+    Read the sample rate, channel count and duration of the first audio stream of any container ffmpeg can open.
+
+    Args:
+        file_path (str): Path to the audio or video file.
+        ffmpeg (Optional[str]): Path to ffmpeg. If None, ``find_ffmpeg`` is used.
+
+    Returns:
+        Tuple[int, int, Optional[float]]: Sample rate, channel count and duration in seconds (None if unknown).
+
+    Raises:
+        FileNotFoundError: If ffmpeg is not available.
+        ValueError: If the file has no audio stream.
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if ffmpeg is None:
+        raise FileNotFoundError("ffmpeg not found. Place ffmpeg next to the server or add it to PATH.")
+
+    # Without an output ffmpeg prints the stream info and exits with an error, which is expected here.
+    info = subprocess.run([ffmpeg, '-hide_banner', '-nostdin', '-i', file_path],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE).stderr.decode('utf-8', 'replace')
+    stream = _AUDIO_STREAM.search(info)
+    if stream is None:
+        raise ValueError(f"No audio stream found in {file_path}")
+
+    layout = stream.group(2).split('(')[0].strip()
+    count = _CHANNELS.search(layout)
+    channels = int(count.group(1)) if count else CHANNEL_LAYOUTS.get(layout, 2)
+    duration = _DURATION.search(info)
+    seconds = None
+    if duration:
+        hours, minutes, secs = duration.groups()
+        seconds = int(hours) * 3600 + int(minutes) * 60 + float(secs)
+    return int(stream.group(1)), channels, seconds
+
+
+def decode(file_path: str, sr: Optional[int] = None, channels: Optional[int] = None,
+           ffmpeg: Optional[str] = None, block_bytes: int = 1 << 20) -> Tuple[np.ndarray, int]:
+    """
+    Decode the first audio stream of a file by piping float32 PCM from ffmpeg into a NumPy buffer.
+
+    ffmpeg resamples and remixes to the requested layout while decoding, so nothing is written
+    to disk. The buffer is sized from the probed duration and filled in place as ffmpeg writes;
+    it only grows if the file turns out longer than probed. The result is copied out channel by
+    channel, so it is contiguous and does not keep the read buffer alive.
+    ffmpeg's messages go to an anonymous temporary file rather than a second pipe, which would
+    stall ffmpeg once it filled up while only stdout is being read.
+
+    Args:
+        file_path (str): Path to the audio or video file, in any container ffmpeg can read.
+        sr (Optional[int]): Target sample rate. If None, the native rate is kept.
+        channels (Optional[int]): Target channel count, e.g. 1 to downmix. If None, the native count is kept.
+        ffmpeg (Optional[str]): Path to ffmpeg. If None, ``find_ffmpeg`` is used.
+        block_bytes (int): Size of each read from the pipe.
+
+    Returns:
+        Tuple[np.ndarray, int]: ``(channels, samples)`` float32 audio and its sample rate.
+
+    Raises:
+        FileNotFoundError: If ffmpeg is not available.
+        RuntimeError: If ffmpeg fails to decode the file.
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    native_sr, native_channels, duration = probe(file_path, ffmpeg)
+    sr = sr or native_sr
+    channels = channels or native_channels
+
+    command = [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-i', file_path,
+               '-map', '0:a:0', '-vn', '-f', 'f32le', '-acodec', 'pcm_f32le',
+               '-ac', str(channels), '-ar', str(sr), 'pipe:1']
+
+    frame_bytes = 4 * channels
+    capacity = int(((duration or 60.0) + 1.0) * sr) * frame_bytes
+    buffer = np.empty(capacity, dtype=np.uint8)
+    filled = 0
+    with Metrics.timed('AudioDecoder', 'decode'), tempfile.TemporaryFile() as stderr, \
+            subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr) as process:
+        while True:
+            if filled == buffer.size:
+                buffer = np.resize(buffer, buffer.size * 3 // 2 + block_bytes)
+            read = process.stdout.readinto(memoryview(buffer)[filled:filled + min(block_bytes, buffer.size - filled)])
+            if not read:
+                break
+            filled += read
+        process.wait()
+        stderr.seek(0)
+        errors = stderr.read().decode('utf-8', 'replace')
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {file_path}: {errors.strip()}")
+
+    Metrics.count_bytes('AudioDecoder', 'read', os.path.getsize(file_path))
+    frames = filled // frame_bytes
+    y = buffer[:frames * frame_bytes].view(np.float32).reshape(frames, channels).T.copy()
+    return y, sr
+
+
+def stream(file_path: str, sr: Optional[int] = None, channels: Optional[int] = None,
+           ffmpeg: Optional[str] = None, block_frames: int = 1 << 16) -> Iterator[np.ndarray]:
+    """
+    Decode the first audio stream of a file block by block, so memory use does not depend on its duration.
+
+    Args:
+        file_path (str): Path to the audio or video file, in any container ffmpeg can read.
+        sr (Optional[int]): Target sample rate. If None, the native rate is kept.
+        channels (Optional[int]): Target channel count, e.g. 1 to downmix. If None, the native count is kept.
+        ffmpeg (Optional[str]): Path to ffmpeg. If None, ``find_ffmpeg`` is used.
+        block_frames (int): Number of sample frames per block. The last block may be shorter.
+
+    Yields:
+        np.ndarray: ``(channels, frames)`` float32 blocks.
+
+    Raises:
+        FileNotFoundError: If ffmpeg is not available.
+        RuntimeError: If ffmpeg fails to decode the file.
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if ffmpeg is None:
+        raise FileNotFoundError("ffmpeg not found. Place ffmpeg next to the server or add it to PATH.")
+    if sr is None or channels is None:
+        native_sr, native_channels, _ = probe(file_path, ffmpeg)
+        sr = sr or native_sr
+        channels = channels or native_channels
+
+    command = [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-i', file_path,
+               '-map', '0:a:0', '-vn', '-f', 'f32le', '-acodec', 'pcm_f32le',
+               '-ac', str(channels), '-ar', str(sr), 'pipe:1']
+    frame_bytes = 4 * channels
+    with tempfile.TemporaryFile() as stderr, \
+            subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr) as process:
+        try:
+            while True:
+                # A buffered read returns short only at the end of the stream.
+                data = process.stdout.read(block_frames * frame_bytes)
+                frames = len(data) // frame_bytes
+                if frames:
+                    Metrics.count_bytes('AudioDecoder', 'streamed', frames * frame_bytes)
+                    yield np.frombuffer(data, dtype=np.float32, count=frames * channels).reshape(frames, channels).T
+                if len(data) < block_frames * frame_bytes:
+                    break
+            process.wait()
+        finally:
+            # The consumer may stop early; ffmpeg must not be left blocked on a full pipe.
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if process.returncode != 0:
+            stderr.seek(0)
+            errors = stderr.read().decode('utf-8', 'replace')
+            raise RuntimeError(f"ffmpeg failed to decode {file_path}: {errors.strip()}")
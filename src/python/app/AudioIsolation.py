@@ -1,12 +1,22 @@
 import os
+import sys
 import subprocess
-import librosa
-from typing import List, Optional, Union
+from typing import Callable, List, Optional, Union
 import uuid
 
+import AudioDecoder
+import Metrics
+import RunOutput
+
 class DemucsHelper:
     """
     Helper class to facilitate the use of the Demucs command for music source separation.
+
+    If an ``engine`` (a ``SeparationEngine``) is given, separation runs in-process on its
+    warm models instead of spawning the ``demucs`` CLI, reading decoded audio from
+    ``audio_store`` (an ``AudioStore``) when one is given. If a ``segmenter`` (a
+    ``SegmentedSeparator``) is given instead, each file is split into overlapping segments
+    of ``segment_seconds`` that are separated in parallel worker processes.
     """
 
     VALID_MODELS = {'htdemucs', 'htdemucs_ft', 'htdemucs_6s', 'hdemucs_mmi', 'mdx', 'mdx_extra', 'mdx_q', 'mdx_extra_q'}
@@ -15,13 +25,21 @@ class DemucsHelper:
 
     def __init__(self, model_name: str = 'htdemucs', device: str = 'cuda', shifts: Optional[int] = 0, 
                  two_stems: Optional[str] = None, output_folder: str = 'output_directory', 
-                 audio_files: Optional[List[str]] = None):
+                 audio_files: Optional[List[str]] = None, engine=None, audio_store=None, jobs: int = 4,
+                 segmenter=None, segment_seconds: float = 60.0, overlap_seconds: float = 2.0):
         self.model_name = model_name
         self.device = device
         self.shifts = shifts
         self.two_stems = two_stems
         self.output_folder = os.path.abspath(output_folder)
         self.audio_files = audio_files if audio_files else []
+        self.engine = engine
+        self.audio_store = audio_store
+        self.jobs = jobs
+        self.segmenter = segmenter
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.output_files: List[str] = []
         
         self.validate_parameters()
 
@@ -38,25 +56,49 @@ class DemucsHelper:
         if self.shifts is not None and (not isinstance(self.shifts, int) or self.shifts < 0):
             raise ValueError(f"Invalid shifts: {self.shifts}. Must be a non-negative integer or None.")
 
+        if not isinstance(self.jobs, int) or self.jobs <= 0:
+            raise ValueError(f"Invalid jobs: {self.jobs}. Must be a positive integer.")
+
     def add_audio_file(self, file_path: str):
         if os.path.exists(file_path):
             self.audio_files.append(os.path.abspath(file_path))
         else:
             raise FileNotFoundError(f"Audio file not found: {file_path}")
 
-    def separate(self):
+    def separate(self, progress_callback: Optional[Callable[[str, float], None]] = None):
         if not self.audio_files:
             raise ValueError("No audio files to process.")
+        report = progress_callback or (lambda stage, fraction: None)
         
         run_folder = os.path.join(self.output_folder, str(uuid.uuid4()))
         os.makedirs(run_folder, exist_ok=True)
+        self.output_files = []
+
+        if self.segmenter is not None:
+            count = len(self.audio_files)
+            for index, audio_file in enumerate(self.audio_files):
+                self.output_files += self.segmenter.separate_file(
+                    audio_file, run_folder, shifts=self.shifts, two_stems=self.two_stems,
+                    audio_store=self.audio_store, segment_seconds=self.segment_seconds,
+                    overlap_seconds=self.overlap_seconds,
+                    progress_callback=lambda stage, fraction, i=index: report(stage, (i + fraction) / count))
+            return run_folder
+
+        if self.engine is not None:
+            count = len(self.audio_files)
+            for index, audio_file in enumerate(self.audio_files):
+                self.output_files += self.engine.separate_file(
+                    audio_file, self.model_name, run_folder, shifts=self.shifts, two_stems=self.two_stems,
+                    audio_store=self.audio_store,
+                    progress_callback=lambda stage, fraction, i=index: report(stage, (i + fraction) / count))
+            return run_folder
 
         demucs_command = [
             'demucs',
             '-n', self.model_name,
             '-d', self.device,
             '-o', run_folder,
-            '-j', '4',
+            '-j', str(self.jobs),
             *self.audio_files
         ]
 
@@ -66,86 +108,89 @@ class DemucsHelper:
         if self.shifts is not None:
             demucs_command.extend(['--shifts', str(self.shifts)])
         
+        # The CLI decodes any container through ffmpeg, so make the bundled binary visible to it.
+        env = dict(os.environ)
+        ffmpeg_path = AudioDecoder.find_ffmpeg()
+        if ffmpeg_path is not None:
+            env['PATH'] = os.pathsep.join([os.path.dirname(ffmpeg_path), env.get('PATH', '')])
+
+        report('separate', 0.0)
         try:
-            subprocess.run(demucs_command, check=True)
+            with Metrics.timed('DemucsHelper', 'demucs_cli'):
+                subprocess.run(demucs_command, check=True, env=env)
         except subprocess.CalledProcessError as e:
             print(f"Error running Demucs: {e}")
 
+        for audio_file in self.audio_files:
+            track_folder = os.path.join(run_folder, self.model_name, os.path.splitext(os.path.basename(audio_file))[0])
+            if os.path.isdir(track_folder):
+                self.output_files += [os.path.join(track_folder, name) for name in sorted(os.listdir(track_folder))]
+        report('write', 1.0)
+
         return run_folder
 
 
 class Isolator:
     """
-    Class to handle the conversion of audio files and initiate the Demucs separation process.
+    Class to initiate the Demucs separation process for an audio or video file.
+
+    Sources in any container ffmpeg reads (including ``.mp4``) are decoded by piping PCM from
+    ffmpeg straight into memory, so no temporary WAV is written. With an ``audio_store`` the
+    source is decoded once into the shared store when separation needs it.
     """
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, audio_store=None):
         self.file_path = file_path
-        self.audio_file = self.convert_to_wav(file_path)
-        if self.audio_file:
-            self.y, self.sr = librosa.load(self.audio_file, sr=None)
+        self.run_folder = None
+        self.manifest = None
+        self.audio_store = audio_store
+        self.audio_file = file_path
 
-    def convert_to_wav(self, file_path: str) -> str:
+    def process_audio(self, model_name: str = 'htdemucs', device: str = 'cuda', shifts: Optional[int] = 0, 
+                      two_stems: Optional[str] = None, output_folder: str = 'output_directory', engine=None,
+                      progress_callback: Optional[Callable[[str, float], None]] = None, segmenter=None,
+                      segment_seconds: float = 60.0, overlap_seconds: float = 2.0, stem_format: str = 'wav',
+                      encoder=None):
         """
-        Convert an MP3 file to WAV format.
+        Separate the file, encode the stems to ``stem_format`` and write the run's ``manifest.json``.
 
         Args:
-            file_path (str): Path to the MP3 file.
+            stem_format (str): Delivery format of the stems, one of ``StemEncoder.VALID_FORMATS``.
+            encoder (Optional[StemEncoder]): Shared encoder to use. If None, one is created for this call.
 
         Returns:
-            str: Path to the converted WAV file.
-
-        Raises:
-            subprocess.CalledProcessError: If the conversion fails.
+            List[str]: Paths of the stem files. The full manifest is kept in ``self.manifest``.
         """
-        ffmpeg_path = os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
-        if file_path.endswith('.mp3'):
-            wav_path = file_path.replace('.mp3', '.wav')
-            command = [ffmpeg_path, '-i', file_path, wav_path, '-y']
-            try:
-                subprocess.run(command, check=True)
-                return wav_path
-            except subprocess.CalledProcessError as e:
-                print(f"Error converting file: {e}")
-                return None
-        return file_path
-
-    def process_audio(self, model_name: str = 'htdemucs', device: str = 'cuda', shifts: Optional[int] = 0, 
-                      two_stems: Optional[str] = None, output_folder: str = 'output_directory'):
-        demucs_helper = DemucsHelper(model_name, device, shifts, two_stems, output_folder)
+        report = progress_callback or (lambda stage, fraction: None)
+        separate_share = 1.0 if stem_format == 'wav' else 0.9
+        demucs_helper = DemucsHelper(model_name, device, shifts, two_stems, output_folder, engine=engine,
+                                     audio_store=self.audio_store, segmenter=segmenter,
+                                     segment_seconds=segment_seconds, overlap_seconds=overlap_seconds)
         demucs_helper.add_audio_file(self.audio_file)
-        run_folder = demucs_helper.separate()
-
-        output_files = []
-        for root, _, files in os.walk(run_folder):
-            for file in files:
-                output_files.append(os.path.join(root, file))
+        run_folder = demucs_helper.separate(
+            progress_callback=lambda stage, fraction: report(stage, fraction * separate_share))
+        self.run_folder = run_folder
+
+        encoder = encoder or RunOutput.StemEncoder()
+        stems = encoder.encode(demucs_helper.output_files, stem_format,
+                               progress_callback=lambda stage, fraction: report(
+                                   stage, separate_share + (1 - separate_share) * fraction))
+        self.manifest = RunOutput.write_manifest(run_folder, stems, source=self.file_path, model_name=model_name,
+                                                 format=stem_format)
+        output_files = [stem["path"] for stem in stems]
         print(len(output_files))
         print(f"Output files: {output_files}")
         return output_files
 
 
 def main():
-    file_path = r"c:\Users\tjerf\Downloads\videoplayback - Copy.mp4"
+    if len(sys.argv) < 3:
+        print("Usage: python AudioIsolation.py <audio_file> <output_folder>")
+        print("For timing and memory measurements, use benchmarks/run_benchmarks.py.")
+        return
+    file_path, output_folder = sys.argv[1], sys.argv[2]
     processor = Isolator(file_path)
-    if processor.audio_file:
-        processor.process_audio(output_folder=r"c:\Users\tjerf\Downloads\output")
-
-        wav_file_path = file_path.replace('.mp3', '.wav')
-        if os.path.exists(wav_file_path):
-            os.remove(wav_file_path)
+    processor.process_audio(output_folder=output_folder)
 
 
 if __name__ == "__main__":
-    import cProfile
-    import pstats
-
-    profiler = cProfile.Profile()
-    profiler.enable()
-
     main()
-
-    profiler.disable()
-    with open("profile_output.txt", "w") as f:
-        stats = pstats.Stats(profiler, stream=f)
-        stats.sort_stats(pstats.SortKey.TIME)
-        stats.print_stats(25)
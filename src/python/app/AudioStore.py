@@ -0,0 +1,231 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import librosa
+import numpy as np
+
+import AudioDecoder
+import Metrics
+from ResultCache import content_hash
+
+
+class AudioStore:
+    """
+    Decode-once store of audio buffers shared by isolation and beat tracking.
+
+    Each source is decoded once into a float32 ``(channels, samples)`` array at its native
+    sample rate and saved as a ``.npy`` file keyed by a hash of the source contents. Readers
+    get a read-only memory map, so several consumers share the same pages instead of each
+    holding a private copy. Resampled and mono views are derived from the native buffer on
+    first request and cached per sample rate alongside it. A buffer evicted between being
+    found and being opened, by this or another process sharing the folder, is rebuilt.
+
+    Attributes:
+        store_dir (str): Folder holding the decoded buffers.
+        max_bytes (int): Size budget for all buffers, in bytes. Least recently used buffers are removed first.
+    """
+
+    OPEN_ATTEMPTS = 3
+
+    def __init__(self, store_dir: str = 'audio_store', max_bytes: int = 20 * 1024 ** 3):
+        self.store_dir = os.path.abspath(store_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+        self.validate_parameters()
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def __getstate__(self):
+        return {"store_dir": self.store_dir, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def validate_parameters(self):
+        """
+        Validate the store configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if not isinstance(self.max_bytes, int) or self.max_bytes <= 0:
+            raise ValueError(f"Invalid max_bytes: {self.max_bytes}. Must be a positive integer.")
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _path(self, key: str, sr: Optional[int], mono: bool) -> str:
+        suffix = f"_{sr}" if sr else ""
+        suffix += "_mono" if mono else ""
+        return os.path.join(self.store_dir, f"{key}{suffix}.npy")
+
+    def _native_sr_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f"{key}.sr")
+
+    def _decode(self, file_path: str) -> Tuple[np.ndarray, int]:
+        if AudioDecoder.find_ffmpeg() is not None:
+            return AudioDecoder.decode(file_path)
+        y, sr = librosa.load(file_path, sr=None, mono=False, dtype=np.float32)
+        return np.atleast_2d(y), int(sr)
+
+    @staticmethod
+    def _tmp_path(path: str, suffix: str) -> str:
+        # The store is shared by worker processes, so the thread id alone is not unique.
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp{suffix}"
+
+    def _save(self, path: str, y: np.ndarray):
+        tmp_path = self._tmp_path(path, '.npy')
+        np.save(tmp_path, np.ascontiguousarray(y, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def _save_native_sr(self, key: str, sr: int):
+        path = self._native_sr_path(key)
+        tmp_path = self._tmp_path(path, '')
+        with open(tmp_path, 'w') as f:
+            f.write(str(sr))
+        os.replace(tmp_path, path)
+
+    def _open(self, path: str) -> np.ndarray:
+        os.utime(path)
+        return np.load(path, mmap_mode='r')
+
+    def native_sr(self, file_path: str) -> int:
+        """
+        Return the native sample rate of a source, decoding it if it is not stored yet.
+
+        Args:
+            file_path (str): Path to the audio file.
+
+        Returns:
+            int: Native sample rate.
+        """
+        key = content_hash(file_path)
+        for attempt in range(self.OPEN_ATTEMPTS):
+            self._ensure_native(key, file_path)
+            try:
+                return self._read_native_sr(key)
+            except FileNotFoundError:
+                if attempt == self.OPEN_ATTEMPTS - 1:
+                    raise
+
+    def load_stored(self, file_path: str) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Return the native buffer of a source and its sample rate if it is already stored, without decoding.
+
+        Args:
+            file_path (str): Path to the audio file.
+
+        Returns:
+            Optional[Tuple[np.ndarray, int]]: Memory-mapped ``(channels, samples)`` buffer and sample rate,
+            or None if the source has not been decoded into the store.
+        """
+        key = content_hash(file_path)
+        try:
+            sr = self._read_native_sr(key)
+            y = self._open(self._path(key, None, False))
+        except (OSError, ValueError):
+            return None
+        Metrics.count_cache('audio_store', True)
+        return y, sr
+
+    def _read_native_sr(self, key: str) -> int:
+        with open(self._native_sr_path(key), 'r') as f:
+            return int(f.read())
+
+    def _ensure_native(self, key: str, file_path: str) -> str:
+        path = self._path(key, None, False)
+        with self._key_lock(key):
+            hit = os.path.exists(path) and os.path.exists(self._native_sr_path(key))
+            Metrics.count_cache('audio_store', hit)
+            if not hit:
+                with Metrics.timed('AudioStore', 'decode'):
+                    y, sr = self._decode(file_path)
+                Metrics.count_bytes('AudioStore', 'read', os.path.getsize(file_path))
+                self._save(path, y)
+                self._save_native_sr(key, sr)
+                self.evict(keep=key)
+        return path
+
+    def load(self, file_path: str, sr: Optional[int] = None, mono: bool = False) -> np.ndarray:
+        """
+        Return a read-only ``(channels, samples)`` float32 view of a source, or ``(samples,)`` if ``mono``.
+
+        Args:
+            file_path (str): Path to the audio file.
+            sr (Optional[int]): Target sample rate. If None, the native rate is used.
+            mono (bool): Whether to downmix to a single channel.
+
+        Returns:
+            np.ndarray: Memory-mapped audio buffer.
+        """
+        key = content_hash(file_path)
+        for attempt in range(self.OPEN_ATTEMPTS):
+            try:
+                return self._load(key, file_path, sr, mono)
+            except FileNotFoundError:
+                # Evicted after it was found; the next attempt decodes or derives it again.
+                if attempt == self.OPEN_ATTEMPTS - 1:
+                    raise
+
+    def _load(self, key: str, file_path: str, sr: Optional[int], mono: bool) -> np.ndarray:
+        native_path = self._ensure_native(key, file_path)
+        native_sr = self._read_native_sr(key)
+        if sr == native_sr:
+            sr = None
+
+        path = self._path(key, sr, mono)
+        if path == native_path:
+            return self._open(path)
+
+        with self._key_lock(key):
+            if not os.path.exists(path):
+                y = np.load(native_path, mmap_mode='r')
+                if mono:
+                    y = y.mean(axis=0)
+                if sr:
+                    with Metrics.timed('AudioStore', 'resample'):
+                        y = librosa.resample(np.asarray(y), orig_sr=native_sr, target_sr=sr)
+                self._save(path, y)
+                self.evict(keep=key)
+        return self._open(path)
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Remove least recently used buffers until the store is under its size budget.
+
+        Args:
+            keep (Optional[str]): Key whose buffers must not be removed.
+        """
+        entries = []
+        for name in os.listdir(self.store_dir):
+            if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                continue
+            path = os.path.join(self.store_dir, name)
+            sidecar = f"{path[:-len('.npy')]}.peaks.npz"
+            try:
+                stat = os.stat(path)
+                # Removed with the buffer, so counted against the budget with it too.
+                size = stat.st_size + (os.path.getsize(sidecar) if os.path.exists(sidecar) else 0)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, name, path))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, name, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and name.startswith(keep):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                # Derived data saved next to a buffer, e.g. waveform peaks, goes with it.
+                sidecar = f"{path[:-len('.npy')]}.peaks.npz"
+                if os.path.exists(sidecar):
+                    os.remove(sidecar)
+            except OSError:
+                # Still memory-mapped by a reader on platforms that lock open files.
+                pass
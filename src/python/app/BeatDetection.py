@@ -1,7 +1,16 @@
 import json
+import multiprocessing
 import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import librosa
-from typing import List, Optional, Tuple, Dict, Union
+import numpy as np
+
+import AudioDecoder
+import BeatFormats
+import Metrics
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Dict, Union
 
 class BeatTracker:
     """
@@ -15,11 +24,15 @@ class BeatTracker:
         trim (bool): Whether to trim silence at the beginning and end of the audio.
         sr (Optional[int]): Sample rate of the audio file. If None, defaults to 22050.
         audio_files (List[str]): List of audio files to process.
+        audio_store (Optional[AudioStore]): Shared store of decoded audio. If None, each file is decoded by piping it through
+            ffmpeg, or with librosa if ffmpeg is not available.
+        feature_cache (Optional[FeatureCache]): Cache of onset envelopes and tempograms, so that changing
+            ``tightness`` or ``start_bpm`` only re-runs the tracking step.
     """
     
     def __init__(self, hop_length: int = 512, bpm: Optional[float] = None, start_bpm: float = 120.0, 
                  tightness: float = 100.0, trim: bool = True, sr: Optional[int] = 22050, 
-                 audio_files: Optional[List[str]] = None):
+                 audio_files: Optional[List[str]] = None, audio_store=None, feature_cache=None):
         self.hop_length = hop_length
         self.bpm = bpm
         self.start_bpm = start_bpm
@@ -27,6 +40,8 @@ class BeatTracker:
         self.trim = trim
         self.sr = sr
         self.audio_files = audio_files if audio_files else []
+        self.audio_store = audio_store
+        self.feature_cache = feature_cache
         
         self.validate_parameters()
 
@@ -70,68 +85,484 @@ class BeatTracker:
         else:
             raise FileNotFoundError(f"Audio file not found: {file_path}")
 
-    def track_beats(self) -> List[Dict[str, Union[str, List[float], float]]]:
+    def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
+        """
+        Load a file as mono audio at ``sr``, from the audio store when one is configured.
+
+        Args:
+            file_path (str): Path to the audio file.
+
+        Returns:
+            Tuple[np.ndarray, int]: Audio samples and their sample rate.
+        """
+        with Metrics.timed('BeatTracker', 'decode'):
+            if self.audio_store is None and AudioDecoder.find_ffmpeg() is not None:
+                y, sr = AudioDecoder.decode(file_path, sr=self.sr, channels=1)
+                y = y[0]
+            elif self.audio_store is None:
+                y, sr = librosa.load(file_path, sr=self.sr)
+            else:
+                sr = self.sr or self.audio_store.native_sr(file_path)
+                y = self.audio_store.load(file_path, sr=sr, mono=True)
+        Metrics.count_bytes('BeatTracker', 'read', y.nbytes)
+        return y, sr
+
+    def compute_features(self, file_path: str, hop_length: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Compute the parameter-independent beat tracking features of a file, reusing cached ones.
+
+        Args:
+            file_path (str): Path to the audio file.
+            hop_length (Optional[int]): Hop length of the onset envelope. Defaults to ``self.hop_length``.
+
+        Returns:
+            Dict[str, np.ndarray]: ``onset_envelope``, the time-averaged ``tempogram``, the
+            ``trim_bounds`` of the signal in samples and its sample rate ``sr``.
+        """
+        hop_length = hop_length or self.hop_length
+        key = None
+        if self.feature_cache is not None:
+            key = self.feature_cache.make_key(file_path, self.sr, hop_length, self.trim)
+            features = self.feature_cache.get(key)
+            Metrics.count_cache('features', features is not None)
+            if features is not None:
+                return features
+
+        y, sr = self.load_audio(file_path)
+        if self.trim:
+            with Metrics.timed('BeatTracker', 'trim'):
+                y, trim_bounds = librosa.effects.trim(y)
+        else:
+            trim_bounds = np.array([0, len(y)])
+
+        with Metrics.timed('BeatTracker', 'onset'):
+            onset_envelope = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length, aggregate=np.median)
+        # Same window as librosa.feature.tempo's default ac_size of 8 seconds.
+        win_length = librosa.time_to_frames(8.0, sr=sr, hop_length=hop_length).item()
+        with Metrics.timed('BeatTracker', 'tempogram'):
+            tempogram = librosa.feature.tempogram(onset_envelope=onset_envelope, sr=sr, hop_length=hop_length,
+                                                  win_length=win_length)
+        features = {
+            "onset_envelope": onset_envelope,
+            "tempogram": tempogram.mean(axis=-1, keepdims=True),
+            "trim_bounds": np.asarray(trim_bounds),
+            "sr": np.asarray(sr),
+        }
+        if key is not None:
+            self.feature_cache.put(key, features)
+        return features
+
+    def track_features(self, features: Dict[str, np.ndarray], hop_length: Optional[int] = None,
+                       start_bpm: Optional[float] = None, tightness: Optional[float] = None
+                       ) -> Tuple[float, np.ndarray]:
+        """
+        Run tempo estimation and the beat tracking step on precomputed features.
+
+        Args:
+            features (Dict[str, np.ndarray]): Features from ``compute_features``.
+            hop_length (Optional[int]): Hop length the features were computed with. Defaults to ``self.hop_length``.
+            start_bpm (Optional[float]): Initial guess for the BPM. Defaults to ``self.start_bpm``.
+            tightness (Optional[float]): Tightness of beat distribution. Defaults to ``self.tightness``.
+
+        Returns:
+            Tuple[float, np.ndarray]: Estimated tempo and beat times in seconds.
+        """
+        hop_length = hop_length or self.hop_length
+        start_bpm = start_bpm or self.start_bpm
+        tightness = tightness or self.tightness
+        sr = int(features["sr"])
+
+        with Metrics.timed('BeatTracker', 'tempo'):
+            tempo = librosa.feature.tempo(onset_envelope=features["onset_envelope"], sr=sr, hop_length=hop_length,
+                                          start_bpm=start_bpm, tg=features["tempogram"])
+        tempo = float(np.atleast_1d(tempo)[0])
+        with Metrics.timed('BeatTracker', 'beat_dp'):
+            _, beat_frames = librosa.beat.beat_track(onset_envelope=features["onset_envelope"], sr=sr,
+                                                     hop_length=hop_length, start_bpm=start_bpm, tightness=tightness,
+                                                     bpm=tempo)
+        return tempo, librosa.frames_to_time(beat_frames, sr=sr, hop_length=hop_length)
+
+    def track_beats(self, progress_callback: Optional[Callable[[str, float], None]] = None
+                    ) -> List[Dict[str, Union[str, List[float], float]]]:
         """
         Track beats in the audio files.
 
+        Args:
+            progress_callback (Optional[Callable[[str, float], None]]): Called with the stage name
+                and the fraction of all files processed.
+
         Returns:
             List[Dict[str, Union[str, List[float], float]]]: List of dictionaries containing file path, beat times, and estimated tempo.
         """
+        report = progress_callback or (lambda stage, fraction: None)
+        count = len(self.audio_files)
         results = []
-        for file_path in self.audio_files:
-            y, sr = librosa.load(file_path, sr=self.sr)
-            
-            if self.trim:
-                y, _ = librosa.effects.trim(y)
-            
-            tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr, hop_length=self.hop_length, 
-                                                         start_bpm=self.start_bpm, tightness=self.tightness)
-            
-            beat_times = librosa.frames_to_time(beat_frames, sr=sr, hop_length=self.hop_length)
+        for index, file_path in enumerate(self.audio_files):
+            report('onset', index / count)
+            features = self.compute_features(file_path)
+
+            report('track', (index + 0.8) / count)
+            tempo, beat_times = self.track_features(features)
             
             results.append({
                 "file_path": file_path,
                 "beat_times": beat_times.tolist(),
+                "tempo": tempo,
             })
         
+        report('done', 1.0)
+        return results
+
+    def sweep(self, file_path: str, tightness_values: List[float], start_bpm_values: List[float],
+              hop_lengths: Optional[List[int]] = None) -> List[Dict[str, Union[int, float, List[float]]]]:
+        """
+        Track beats in one file for every combination of a grid of parameter values.
+
+        Features are computed once per hop length, so each grid point only costs the tracking step.
+
+        Args:
+            file_path (str): Path to the audio file.
+            tightness_values (List[float]): Tightness values to try.
+            start_bpm_values (List[float]): Start BPM values to try.
+            hop_lengths (Optional[List[int]]): Hop lengths to try. Defaults to ``[self.hop_length]``.
+
+        Returns:
+            List[Dict[str, Union[int, float, List[float]]]]: Parameters, estimated tempo and beat times per grid point.
+        """
+        results = []
+        for hop_length in hop_lengths or [self.hop_length]:
+            features = self.compute_features(file_path, hop_length=hop_length)
+            for start_bpm in start_bpm_values:
+                for tightness in tightness_values:
+                    tempo, beat_times = self.track_features(features, hop_length=hop_length,
+                                                            start_bpm=start_bpm, tightness=tightness)
+                    results.append({
+                        "hop_length": hop_length,
+                        "start_bpm": start_bpm,
+                        "tightness": tightness,
+                        "tempo": tempo,
+                        "beat_times": beat_times.tolist(),
+                    })
+        return results
+
+    def iter_beats_streaming(self, file_path: str, block_seconds: float = 30.0, window_seconds: float = 60.0,
+                             overlap_seconds: float = 10.0, n_fft: int = 2048,
+                             progress_callback: Optional[Callable[[str, float], None]] = None
+                             ) -> Iterator[Dict[str, Union[str, List[float], float]]]:
+        """
+        Track beats in a single file in bounded memory, yielding beat times window by window.
+
+        The file is read block by block: from the audio store's memory map at the native rate if
+        the store already holds it, otherwise piped from ffmpeg at ``sr``, so any container ffmpeg
+        can open is supported and tracking starts before decoding ends. Without either only
+        formats libsndfile reads are. The onset envelope is computed incrementally from a log-mel spectrogram of each block. Beats
+        are tracked on overlapping windows of the envelope; each window only emits beats from its
+        core region (half the overlap is ceded to each neighbour), which stitches the windows
+        together without duplicate or missing beats at the seams. Memory use depends on the
+        window size, not on the file duration.
+
+        ``hop_length`` and ``n_fft`` are interpreted at ``sr`` and scaled to the rate the blocks are read at.
+        Silence is not trimmed in streaming mode, and beat times are relative to the start of the file.
+
+        Args:
+            file_path (str): Path to the audio file.
+            block_seconds (float): Duration of audio decoded per block.
+            window_seconds (float): Duration of onset envelope tracked per window.
+            overlap_seconds (float): Overlap between consecutive windows.
+            n_fft (int): FFT size of the onset spectrogram at ``sr``.
+            progress_callback (Optional[Callable[[str, float], None]]): Called with the stage name
+                and the fraction of the file processed.
+
+        Yields:
+            Dict[str, Union[str, List[float], float]]: File path, beat times of the window's core
+            region, window bounds in seconds and the window's tempo estimate.
+        """
+        if overlap_seconds <= 0 or window_seconds <= 2 * overlap_seconds:
+            raise ValueError(f"Invalid window_seconds/overlap_seconds: {window_seconds}/{overlap_seconds}. "
+                             "The window must be more than twice the overlap, which must be positive.")
+
+        report = progress_callback or (lambda stage, fraction: None)
+        sr_native, duration, samples = self._stream_samples(file_path)
+        scale = sr_native / (self.sr or sr_native)
+        hop = max(1, int(round(self.hop_length * scale)))
+        frame_length = max(hop, int(round(n_fft * scale)))
+        frames_per_second = sr_native / hop
+        total_frames = max(1.0, duration * frames_per_second)
+
+        window = int(window_seconds * frames_per_second)
+        overlap = int(overlap_seconds * frames_per_second)
+        block_length = max(1, int(block_seconds * frames_per_second))
+
+        stream = self._frame_blocks(samples, block_length, frame_length, hop)
+
+        envelope = np.zeros(0, dtype=np.float32)
+        envelope_start = 0  # Absolute frame index of envelope[0].
+        emitted_until = 0  # Absolute frame index up to which beats have been emitted.
+        last_beat = None
+        prev_column = None
+
+        def track_window(final: bool):
+            nonlocal envelope, envelope_start, emitted_until, last_beat
+            with Metrics.timed('BeatTracker', 'stream_beat_dp'):
+                tempo, beats = librosa.beat.beat_track(onset_envelope=envelope, sr=sr_native, hop_length=hop,
+                                                       start_bpm=self.start_bpm, tightness=self.tightness)
+            core_end = envelope_start + len(envelope) if final else envelope_start + len(envelope) - overlap // 2
+            beats = beats + envelope_start
+            beats = beats[(beats >= emitted_until) & (beats < core_end)]
+
+            tempo = float(np.atleast_1d(tempo)[0])
+            if last_beat is not None and len(beats) and tempo > 0:
+                min_gap = 0.5 * frames_per_second * 60.0 / tempo
+                beats = beats[beats - last_beat >= min_gap]
+            if len(beats):
+                last_beat = int(beats[-1])
+
+            beat_times = (beats * hop + frame_length // 2) / sr_native
+            result = {
+                "file_path": file_path,
+                "beat_times": beat_times.tolist(),
+                "window": [emitted_until / frames_per_second, core_end / frames_per_second],
+                "tempo": tempo,
+            }
+            emitted_until = core_end
+            keep_from = len(envelope) - overlap
+            envelope = envelope[keep_from:]
+            envelope_start += keep_from
+            return result
+
+        report('decode', 0.0)
+        for block in stream:
+            Metrics.count_bytes('BeatTracker', 'read', block.nbytes)
+            with Metrics.timed('BeatTracker', 'stream_onset'):
+                mel = librosa.feature.melspectrogram(y=block, sr=sr_native, n_fft=frame_length, hop_length=hop,
+                                                     center=False)
+                mel_db = librosa.power_to_db(mel, top_db=None)
+                if prev_column is not None:
+                    mel_db = np.concatenate([prev_column, mel_db], axis=1)
+                else:
+                    mel_db = np.concatenate([mel_db[:, :1], mel_db], axis=1)
+                prev_column = mel_db[:, -1:]
+                onset = np.maximum(0.0, np.diff(mel_db, axis=1)).mean(axis=0).astype(np.float32)
+            envelope = np.concatenate([envelope, onset])
+
+            while len(envelope) >= window:
+                yield track_window(final=False)
+            report('track', min(1.0, (envelope_start + len(envelope)) / total_frames))
+
+        if len(envelope) > (overlap // 2 if emitted_until else 0):
+            yield track_window(final=True)
+        report('done', 1.0)
+
+    def _stream_samples(self, file_path: str) -> Tuple[int, float, Iterator[np.ndarray]]:
+        # Sample rate, duration in seconds and mono sample blocks of a file, read incrementally so
+        # memory stays flat and the first window can be tracked before the file is fully decoded.
+        block = 1 << 18
+        stored = self.audio_store.load_stored(file_path) if self.audio_store is not None else None
+        if stored is not None:
+            y, sr_native = stored
+            # Downmixed block by block; the store's mono buffer would be built from the whole file.
+            blocks = (np.asarray(y[:, start:start + block], dtype=np.float32).mean(axis=0)
+                      for start in range(0, y.shape[-1], block))
+            return sr_native, y.shape[-1] / sr_native, blocks
+        if AudioDecoder.find_ffmpeg() is not None:
+            sr_native, _, duration = AudioDecoder.probe(file_path)
+            sr = self.sr or sr_native
+            blocks = (channels[0] for channels in AudioDecoder.stream(file_path, sr=sr, channels=1,
+                                                                       block_frames=block))
+            return sr, duration or 0.0, blocks
+        try:
+            sr_native = librosa.get_samplerate(file_path)
+        except Exception as e:
+            raise ValueError(f"Cannot stream {file_path} without ffmpeg: {e}") from e
+        return sr_native, librosa.get_duration(path=file_path), \
+            librosa.stream(file_path, block_length=1, frame_length=block, hop_length=block, mono=True, fill_value=0)
+
+    @staticmethod
+    def _frame_blocks(samples: Iterable[np.ndarray], block_length: int, frame_length: int,
+                      hop: int) -> Iterator[np.ndarray]:
+        # Regroup sample blocks like ``librosa.stream``: each block holds ``block_length`` frames of
+        # ``frame_length`` samples ``hop`` apart, the next block starts ``block_length`` hops later,
+        # and the last one is zero-padded to whole frames.
+        size = (block_length - 1) * hop + frame_length
+        step = block_length * hop
+        buffer = np.zeros(0, dtype=np.float32)
+        consumed = 0  # Samples at the start of ``buffer`` already covered by an earlier block.
+        for chunk in samples:
+            buffer = np.concatenate([buffer, np.asarray(chunk, dtype=np.float32)])
+            while len(buffer) >= size:
+                yield buffer[:size]
+                buffer = buffer[step:]
+                consumed = max(0, size - step)
+        if len(buffer) > consumed:
+            frames = 1 + max(0, -(-(len(buffer) - frame_length) // hop))
+            yield np.pad(buffer, (0, (frames - 1) * hop + frame_length - len(buffer)))
+
+    def track_beats_streaming(self, progress_callback: Optional[Callable[[str, float], None]] = None,
+                              **stream_kwargs) -> List[Dict[str, Union[str, List[float], float]]]:
+        """
+        Track beats in the audio files with ``iter_beats_streaming`` and collect the windows.
+
+        Args:
+            progress_callback (Optional[Callable[[str, float], None]]): Called with the stage name
+                and the fraction of all files processed.
+            **stream_kwargs: Passed on to ``iter_beats_streaming``.
+
+        Returns:
+            List[Dict[str, Union[str, List[float], float]]]: List of dictionaries containing file path and beat times.
+        """
+        report = progress_callback or (lambda stage, fraction: None)
+        count = len(self.audio_files)
+        results = []
+        for index, file_path in enumerate(self.audio_files):
+            beat_times = []
+            for window in self.iter_beats_streaming(
+                    file_path, progress_callback=lambda stage, fraction, i=index: report(stage, (i + fraction) / count),
+                    **stream_kwargs):
+                beat_times.extend(window["beat_times"])
+            results.append({
+                "file_path": file_path,
+                "beat_times": beat_times,
+            })
         return results
 
-    def save_beat_times(self, results: List[Dict[str, Union[str, List[float], float]]], output_folder: str):
+    def _worker_params(self) -> Dict[str, object]:
+        return {"hop_length": self.hop_length, "bpm": self.bpm, "start_bpm": self.start_bpm,
+                "tightness": self.tightness, "trim": self.trim, "sr": self.sr, "audio_store": self.audio_store,
+                "feature_cache": self.feature_cache}
+
+    def track_beats_parallel(self, executor: Optional[Executor] = None, max_workers: Optional[int] = None,
+                             on_broken: Optional[Callable[[Executor], None]] = None
+                             ) -> Iterator[Dict[str, Union[str, List[float], float]]]:
+        """
+        Track beats in the audio files across a process pool, yielding each result as its file finishes.
+
+        A file that fails yields a dictionary with an ``error`` key instead of beat times, so one
+        bad file does not fail the batch. This includes files lost because a worker process died
+        and broke the pool.
+
+        Args:
+            executor (Optional[Executor]): Pool to submit to, e.g. from ``create_worker_pool``. If None,
+                a temporary pool is created for this call.
+            max_workers (Optional[int]): Size of the temporary pool. Defaults to the number of CPUs.
+            on_broken (Optional[Callable[[Executor], None]]): Called once with a shared ``executor``
+                if it breaks, so its owner can replace it.
+
+        Yields:
+            Dict[str, Union[str, List[float], float]]: File path and beat times, or file path and error.
+        """
+        owns_executor = executor is None
+        if owns_executor:
+            executor = create_worker_pool(max_workers)
+        params = self._worker_params()
+        futures = {}
+        broken = None
+        try:
+            for file_path in self.audio_files:
+                try:
+                    futures[executor.submit(_track_file, params, file_path)] = file_path
+                except BrokenProcessPool as e:
+                    broken = e
+                    yield {"file_path": file_path, "error": f"Worker pool is broken: {e}"}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except BrokenProcessPool as e:
+                    broken = e
+                    yield {"file_path": futures[future], "error": f"Worker process died: {e}"}
+        finally:
+            if broken is not None and not owns_executor and on_broken is not None:
+                on_broken(executor)
+            for future in futures:
+                future.cancel()
+            if owns_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def save_beat_times(self, results: List[Dict[str, Union[str, List[float], float]]], output_folder: str,
+                        format: str = 'json'):
         """
-        Save the beat times to text files.
+        Save the beat times to one file per input.
 
         Args:
             results (List[Dict[str, Union[str, List[float], float]]]): List of dictionaries containing file path, beat times, and estimated tempo.
             output_folder (str): Folder where the beat times will be saved.
+            format (str): ``json`` for indented JSON, or ``npy`` for a float32 array of beat times.
         """
+        if format not in ('json', 'npy'):
+            raise ValueError(f"Invalid format: {format}. Valid options are: {{'json', 'npy'}}")
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
         
         for result in results:
             base_name = os.path.basename(result["file_path"])
-            output_file = os.path.join(output_folder, f"{os.path.splitext(base_name)[0]}_beats.json")
-            with open(output_file, 'w') as f:
-                json.dump(result, f, indent=4)
+            output_file = os.path.join(output_folder, f"{os.path.splitext(base_name)[0]}_beats.{format}")
+            if format == 'npy':
+                np.save(output_file, np.asarray(result["beat_times"], dtype=np.float32))
+            else:
+                with open(output_file, 'w') as f:
+                    json.dump(result, f, indent=4)
             print(f"Saved beat times to {output_file}")
 
+    def save_beat_times_bulk(self, results: List[Dict[str, Union[str, List[float], float]]], output_path: str) -> str:
+        """
+        Save the beat times, tempo and tracking parameters of many files into one indexed ``.npz`` file.
+
+        Args:
+            results (List[Dict[str, Union[str, List[float], float]]]): List of dictionaries containing file path, beat times, and estimated tempo.
+            output_path (str): Path of the file to write.
+
+        Returns:
+            str: Path of the written file.
+        """
+        metadata = {key: value for key, value in self._worker_params().items() if isinstance(value, (int, float, bool))}
+        with BeatFormats.BulkBeatWriter(output_path, metadata) as writer:
+            writer.extend(results)
+        print(f"Saved beat times of {len(results)} files to {writer.output_path}")
+        return writer.output_path
+
+def warm_up():
+    """
+    Trigger numba compilation of the beat tracker on a short synthetic signal so the first
+    real file does not pay for it. Also used as the process pool initializer.
+    """
+    y = np.random.default_rng(0).standard_normal(22050 * 2).astype(np.float32) * 0.1
+    librosa.beat.beat_track(y=y, sr=22050)
+
+
+def _track_file(params: Dict[str, object], file_path: str
+                ) -> Dict[str, Union[str, List[float], float]]:
+    try:
+        return BeatTracker(audio_files=[file_path], **params).track_beats()[0]
+    except Exception as e:
+        return {"file_path": file_path, "error": str(e)}
+
+
+def create_worker_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Create a process pool whose workers have librosa imported and its numba kernels compiled.
+
+    Workers are spawned rather than forked: the server forking with live job threads could copy
+    locks held by them into a child, where they are never released.
+
+    Args:
+        max_workers (Optional[int]): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        ProcessPoolExecutor: The warmed-up pool.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=warm_up,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
 def main():
-    file_path = r"C:\Users\tjerf\Downloads\rocky_audio.wav"
+    if len(sys.argv) < 2:
+        print("Usage: python BeatDetection.py <audio_file> [<audio_file> ...]")
+        print("For timing and memory measurements, use benchmarks/run_benchmarks.py.")
+        return
     beat_tracker = BeatTracker()
-    beat_tracker.add_audio_file(file_path)
+    for file_path in sys.argv[1:]:
+        beat_tracker.add_audio_file(file_path)
     results = beat_tracker.track_beats()
     print(results)
 
 if __name__ == "__main__":
-    import cProfile
-    import pstats
-
-    profiler = cProfile.Profile()
-    profiler.enable()
-
     main()
-
-    profiler.disable()
-    with open("profile_output.txt", "w") as f:
-        stats = pstats.Stats(profiler, stream=f)
-        stats.sort_stats(pstats.SortKey.TIME)
-        stats.print_stats(25)
@@ -0,0 +1,179 @@
+import io
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+NPZ_MIMETYPE = 'application/x-npz'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+FORMATS = {'json': JSON_MIMETYPE, 'npz': NPZ_MIMETYPE, 'msgpack': MSGPACK_MIMETYPE}
+
+
+def available_formats() -> List[str]:
+    return [name for name in FORMATS if name != 'msgpack' or msgpack is not None]
+
+
+def negotiate(accept_mimetypes, requested: Optional[str] = None) -> str:
+    """
+    Pick a response format from an explicit request or the ``Accept`` header. JSON is the default.
+
+    Args:
+        accept_mimetypes: The request's ``Accept`` header, as parsed by werkzeug.
+        requested (Optional[str]): Format name that overrides the header, e.g. from a query parameter.
+
+    Returns:
+        str: One of ``json``, ``npz`` or ``msgpack``.
+
+    Raises:
+        ValueError: If the requested format is unknown or unavailable.
+    """
+    formats = available_formats()
+    if requested:
+        if requested not in formats:
+            raise ValueError(f"Invalid format: {requested}. Valid options are: {formats}")
+        return requested
+    mimetypes = [FORMATS[name] for name in formats]
+    best = accept_mimetypes.best_match(mimetypes, default=JSON_MIMETYPE)
+    return next(name for name, mimetype in FORMATS.items() if mimetype == best)
+
+
+def to_columns(results: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Pack per-file beat results into columns indexed by ``offsets``.
+
+    Beats of file ``i`` are ``beat_times[offsets[i]:offsets[i + 1]]``. Files that failed keep
+    an empty slice and their message in ``errors``.
+
+    Args:
+        results (List[Dict[str, Any]]): Results from ``BeatTracker``.
+
+    Returns:
+        Dict[str, np.ndarray]: ``file_paths``, ``offsets``, ``beat_times`` (float32), ``tempo`` (float32, NaN if unknown) and ``errors``.
+    """
+    beats = [np.asarray(result.get("beat_times", []), dtype=np.float32) for result in results]
+    offsets = np.zeros(len(results) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in beats])
+    return {
+        "file_paths": np.array([result.get("file_path", "") for result in results], dtype=np.str_),
+        "offsets": offsets,
+        "beat_times": np.concatenate(beats) if beats else np.zeros(0, dtype=np.float32),
+        "tempo": np.array([result.get("tempo", np.nan) for result in results], dtype=np.float32),
+        "errors": np.array([result.get("error", "") for result in results], dtype=np.str_),
+    }
+
+
+def from_columns(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    results = []
+    offsets = columns["offsets"]
+    for index, file_path in enumerate(columns["file_paths"]):
+        result = {"file_path": str(file_path),
+                  "beat_times": columns["beat_times"][offsets[index]:offsets[index + 1]]}
+        if not np.isnan(columns["tempo"][index]):
+            result["tempo"] = float(columns["tempo"][index])
+        if columns["errors"][index]:
+            result["error"] = str(columns["errors"][index])
+        results.append(result)
+    return results
+
+
+def encode_results(results: List[Dict[str, Any]], fmt: str = 'json',
+                   metadata: Optional[Dict[str, Any]] = None) -> Tuple[bytes, str]:
+    """
+    Serialise beat results for a response.
+
+    ``npz`` holds the columns from ``to_columns`` plus a JSON ``metadata`` string; ``msgpack``
+    holds a map per file with ``beat_times`` as raw little-endian float32 bytes.
+
+    Args:
+        results (List[Dict[str, Any]]): Results from ``BeatTracker``.
+        fmt (str): One of ``json``, ``npz`` or ``msgpack``.
+        metadata (Optional[Dict[str, Any]]): Extra fields to include, e.g. the tracking parameters.
+
+    Returns:
+        Tuple[bytes, str]: The payload and its mimetype.
+    """
+    metadata = metadata or {}
+    if fmt == 'json':
+        return json.dumps(dict(metadata, results=results)).encode('utf-8'), JSON_MIMETYPE
+
+    if fmt == 'npz':
+        buffer = io.BytesIO()
+        np.savez(buffer, metadata=np.array(json.dumps(metadata)), **to_columns(results))
+        return buffer.getvalue(), NPZ_MIMETYPE
+
+    if fmt == 'msgpack':
+        if msgpack is None:
+            raise ValueError("msgpack is not installed.")
+        packed = []
+        for result in results:
+            entry = {key: value for key, value in result.items() if key != "beat_times"}
+            entry["beat_times"] = np.asarray(result.get("beat_times", []), dtype='<f4').tobytes()
+            packed.append(entry)
+        return msgpack.packb(dict(metadata, results=packed), use_bin_type=True), MSGPACK_MIMETYPE
+
+    raise ValueError(f"Invalid format: {fmt}. Valid options are: {list(FORMATS)}")
+
+
+class BulkBeatWriter:
+    """
+    Columnar writer that collects many files' beats, tempo and metadata into one indexed ``.npz`` file.
+
+    Attributes:
+        output_path (str): Path of the file to write.
+        metadata (Dict[str, Any]): Metadata stored with the results, e.g. the tracking parameters.
+    """
+
+    def __init__(self, output_path: str, metadata: Optional[Dict[str, Any]] = None):
+        self.output_path = os.path.abspath(output_path)
+        self.metadata = metadata or {}
+        self._results: List[Dict[str, Any]] = []
+
+    def add(self, result: Dict[str, Any]):
+        self._results.append(result)
+
+    def extend(self, results: List[Dict[str, Any]]):
+        self._results.extend(results)
+
+    def write(self) -> str:
+        """
+        Write the collected results.
+
+        Returns:
+            str: Path of the written file.
+        """
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        tmp_path = f"{self.output_path}.tmp.npz"
+        np.savez(tmp_path, metadata=np.array(json.dumps(self.metadata)), **to_columns(self._results))
+        os.replace(tmp_path, self.output_path)
+        return self.output_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.write()
+        return False
+
+
+def read_bulk(path: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Read a file written by ``BulkBeatWriter``.
+
+    Args:
+        path (str): Path of the bulk file.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Dict[str, Any]]: Results per file, with ``beat_times`` as float32 arrays, and the metadata.
+    """
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files}
+    return from_columns(columns), json.loads(str(columns["metadata"]))
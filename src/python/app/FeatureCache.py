@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from ResultCache import content_hash
+
+
+class FeatureCache:
+    """
+    Cache of the per-file beat tracking features that do not depend on ``tightness`` or ``start_bpm``.
+
+    For each source, sample rate, hop length and trim setting it keeps the trimmed signal
+    bounds, the onset envelope and the tempogram. Recently used features are held in memory;
+    all features are also written to ``.npz`` files so they survive restarts. Files are
+    removed least recently used first once they grow past ``max_bytes``. With the features at
+    hand, re-tracking with new parameters only runs tempo estimation and the
+    dynamic-programming beat step.
+
+    Attributes:
+        cache_dir (str): Folder holding the feature files.
+        max_entries (int): Number of feature sets kept in memory.
+        max_bytes (int): Size budget for the feature files, in bytes.
+    """
+
+    def __init__(self, cache_dir: str = 'features', max_entries: int = 32, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.validate_parameters()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        return {"cache_dir": self.cache_dir, "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def validate_parameters(self):
+        """
+        Validate the cache configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if not isinstance(self.max_entries, int) or self.max_entries <= 0:
+            raise ValueError(f"Invalid max_entries: {self.max_entries}. Must be a positive integer.")
+
+        if not isinstance(self.max_bytes, int) or self.max_bytes <= 0:
+            raise ValueError(f"Invalid max_bytes: {self.max_bytes}. Must be a positive integer.")
+
+    def make_key(self, file_path: str, sr: Optional[int], hop_length: int, trim: bool) -> str:
+        return f"{content_hash(file_path)}_{sr or 'native'}_{hop_length}_{int(trim)}"
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Look up features in memory, then on disk.
+
+        Args:
+            key (str): Key from ``make_key``.
+
+        Returns:
+            Optional[Dict[str, np.ndarray]]: The features, or None on a miss.
+        """
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                return features
+
+        path = os.path.join(self.cache_dir, f"{key}.npz")
+        try:
+            with np.load(path) as data:
+                features = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, features)
+        return features
+
+    def put(self, key: str, features: Dict[str, np.ndarray]):
+        """
+        Store features in memory and on disk.
+
+        Args:
+            key (str): Key from ``make_key``.
+            features (Dict[str, np.ndarray]): Feature arrays by name.
+        """
+        path = os.path.join(self.cache_dir, f"{key}.npz")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, **features)
+        os.replace(tmp_path, path)
+        self._remember(key, features)
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Remove least recently used feature files until the cache is under its size budget.
+
+        Args:
+            keep (Optional[str]): Key whose file must not be removed.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz') or name.endswith('.tmp.npz'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name, path))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, name, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == f"{keep}.npz":
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def _remember(self, key: str, features: Dict[str, np.ndarray]):
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,492 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import Metrics
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job when it has been cancelled.
+    """
+
+
+class JobDeferred(Exception):
+    """
+    Raised inside a job that cannot be admitted yet. The ``JobQueue`` parks the job and runs it
+    again from the start once admitted jobs release resources.
+
+    Attributes:
+        generation (int): ``AdmissionControl.generation`` when admission was refused.
+    """
+
+    def __init__(self, job_id: str, generation: int):
+        super().__init__(job_id)
+        self.generation = generation
+
+
+class Job:
+    """
+    A unit of work tracked by the ``JobQueue``.
+
+    The work function receives the job and reports progress through ``update``, which also
+    acts as a cancellation checkpoint. Every change bumps ``version`` and wakes threads blocked
+    in ``wait``, so progress can be pushed to clients instead of polled.
+
+    Attributes:
+        id (str): Unique job identifier.
+        kind (str): Type of work, e.g. ``'isolate'`` or ``'beat-detection'``.
+        priority (int): Scheduling priority. Higher values run first.
+        status (str): One of ``queued``, ``running``, ``completed``, ``failed`` or ``cancelled``.
+        stage (str): Current processing stage, e.g. ``decode``, ``separate`` or ``write``.
+        progress (float): Overall progress in percent.
+        result (Any): Return value of the work function once completed.
+        partial (Any): Partial results published by a running job, if any.
+        error (Optional[str]): Error message if the job failed.
+        version (int): Counter incremented on every status, stage or progress change.
+    """
+
+    FINISHED = {'completed', 'failed', 'cancelled'}
+
+    def __init__(self, kind: str, priority: int = 0):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.priority = priority
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.result = None
+        self.partial = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0
+        self._cancel_event = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in self.FINISHED
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def update(self, stage: Optional[str] = None, progress: Optional[float] = None):
+        """
+        Report stage progress and check for cancellation.
+
+        Args:
+            stage (Optional[str]): Name of the current stage.
+            progress (Optional[float]): Overall progress in percent.
+
+        Raises:
+            JobCancelled: If the job has been cancelled.
+        """
+        if self.cancelled:
+            raise JobCancelled(self.id)
+        previous = (self.stage, self.progress)
+        if stage is not None:
+            self.stage = stage
+        if progress is not None:
+            self.progress = max(self.progress, min(float(progress), 100.0))
+        if (self.stage, round(self.progress, 1)) != (previous[0], round(previous[1], 1)):
+            self.notify()
+
+    def notify(self):
+        """
+        Mark the job as changed and wake threads blocked in ``wait``.
+        """
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait(self, since: int, timeout: Optional[float] = None) -> int:
+        """
+        Block until the job changes after ``since`` or finishes.
+
+        Args:
+            since (int): Last ``version`` the caller has seen.
+            timeout (Optional[float]): Maximum time to wait, in seconds.
+
+        Returns:
+            int: The current version, equal to ``since`` if the wait timed out.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != since or self.done, timeout)
+            return self.version
+
+    def progress_callback(self, start: float = 0.0, end: float = 100.0) -> Callable[[str, float], None]:
+        """
+        Build a callback that maps a stage fraction (0-1) onto a slice of the overall progress.
+
+        Args:
+            start (float): Overall progress at fraction 0.
+            end (float): Overall progress at fraction 1.
+
+        Returns:
+            Callable[[str, float], None]: Callback taking a stage name and a fraction.
+        """
+        def callback(stage: str, fraction: float):
+            self.update(stage, start + (end - start) * fraction)
+        return callback
+
+    def cancel(self):
+        self._cancel_event.set()
+        self.notify()
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 1),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "version": self.version,
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if include_result and self.status == 'completed':
+            data["result"] = self.result
+        elif include_result and self.partial is not None:
+            data["partial"] = self.partial
+        return data
+
+
+class JobQueue:
+    """
+    Bounded worker pool that runs jobs by priority and supports cancellation.
+
+    A job that raises ``JobDeferred`` because ``admission`` has no room for it does not hold
+    its worker: it goes back to ``queued``, is parked, and is queued again with its original
+    priority and order when an admitted job releases its resources. Workers meanwhile run
+    other jobs, e.g. beat detection behind a queue of separations.
+
+    Attributes:
+        max_workers (int): Number of worker threads.
+        max_history (int): Number of finished jobs kept for status queries.
+        admission (Optional[AdmissionControl]): Admission control the jobs defer to, if any.
+    """
+
+    def __init__(self, max_workers: int = 2, max_history: int = 1000, admission: Optional["AdmissionControl"] = None):
+        self.max_workers = max_workers
+        self.max_history = max_history
+        self.admission = admission
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._deferred: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+
+        self.validate_parameters()
+        if self.admission is not None:
+            self.admission.add_listener(self._resume_deferred)
+
+        for index in range(self.max_workers):
+            worker = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def validate_parameters(self):
+        """
+        Validate the pool configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if not isinstance(self.max_workers, int) or self.max_workers <= 0:
+            raise ValueError(f"Invalid max_workers: {self.max_workers}. Must be a positive integer.")
+
+        if not isinstance(self.max_history, int) or self.max_history <= 0:
+            raise ValueError(f"Invalid max_history: {self.max_history}. Must be a positive integer.")
+
+    def submit(self, fn: Callable[..., Any], kind: str, priority: int = 0, *args, **kwargs) -> Job:
+        """
+        Queue a work function. It is called as ``fn(job, *args, **kwargs)``.
+
+        Args:
+            fn (Callable[..., Any]): Work function.
+            kind (str): Type of work.
+            priority (int): Scheduling priority. Higher values run first.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(kind, priority)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._queue.put((-priority, next(self._counter), job, fn, args, kwargs))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def pending(self) -> int:
+        with self._lock:
+            deferred = len(self._deferred)
+        return self._queue.qsize() + deferred
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job. Queued jobs never start; running jobs stop at their next checkpoint.
+
+        Args:
+            job_id (str): Job identifier.
+
+        Returns:
+            Optional[Job]: The cancelled job, or None if it is unknown.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel()
+        with self._lock:
+            self._deferred.pop(job.id, None)
+        if self.admission is not None:
+            self.admission.withdraw(job.id)
+        if job.status == 'queued':
+            self._finish(job, 'cancelled')
+        return job
+
+    def _park(self, item: tuple, generation: int):
+        job = item[2]
+        with self._lock:
+            if self.admission.generation == generation and not job.cancelled:
+                self._deferred[job.id] = item
+                return
+        # Resources were released after admission was refused, so it is worth trying again now.
+        self._queue.put(item)
+
+    def _resume_deferred(self):
+        with self._lock:
+            items = list(self._deferred.values())
+            self._deferred.clear()
+        for item in items:
+            self._queue.put(item)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            _, _, job, fn, args, kwargs = item
+            try:
+                if job.cancelled:
+                    if self.admission is not None:
+                        self.admission.withdraw(job.id)
+                    if not job.done:
+                        self._finish(job, 'cancelled')
+                    continue
+
+                if job.started is None:
+                    job.started = time.time()
+                    Metrics.JOB_QUEUE_SECONDS.labels(job.kind).observe(job.started - job.created)
+                job.status = 'running'
+                job.notify()
+                Metrics.JOBS_RUNNING.labels().inc()
+                deferred = False
+                try:
+                    job.result = fn(job, *args, **kwargs)
+                    job.update('done', 100)
+                    self._finish(job, 'completed')
+                except JobDeferred as e:
+                    deferred = True
+                    job.status = 'queued'
+                    job.notify()
+                    self._park(item, e.generation)
+                except JobCancelled:
+                    self._finish(job, 'cancelled')
+                except Exception as e:
+                    logging.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                    job.error = str(e)
+                    self._finish(job, 'failed')
+                finally:
+                    Metrics.JOBS_RUNNING.labels().dec()
+                    if not deferred:
+                        Metrics.JOB_RUN_SECONDS.labels(job.kind).observe(time.time() - job.started)
+                        if self.admission is not None:
+                            # A job that failed or was cancelled while in line must not hold up the rest.
+                            self.admission.withdraw(job.id)
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished = time.time()
+        Metrics.JOBS_TOTAL.labels(job.kind, status).inc()
+        job.notify()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+
+def total_memory() -> Optional[int]:
+    """
+    Return the machine's physical memory in bytes, or None if it cannot be determined.
+    """
+    if psutil is not None:
+        return int(psutil.virtual_memory().total)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class AdmissionControl:
+    """
+    Caps how many heavy jobs run at once against CPU and memory budgets.
+
+    Each job reserves an estimate of the CPU threads and memory it needs before it starts its
+    heavy stage and releases them when done. A job that does not fit raises ``JobDeferred``
+    instead of blocking its worker thread and keeps its place in line, so jobs are admitted in
+    arrival order and a burst of requests queues instead of oversubscribing the machine. A job
+    larger than a whole budget is admitted once it would run alone. Listeners are called
+    whenever resources are released or a waiting job withdraws, so deferred jobs can retry.
+
+    Attributes:
+        cpu_budget (int): CPU threads shared by admitted jobs.
+        memory_budget (Optional[int]): Memory shared by admitted jobs, in bytes. If None, memory is not limited.
+        max_jobs (Optional[int]): Maximum number of admitted jobs. If None, only the budgets apply.
+    """
+
+    def __init__(self, cpu_budget: Optional[int] = None, memory_budget: Optional[int] = None,
+                 max_jobs: Optional[int] = None):
+        self.cpu_budget = cpu_budget if cpu_budget is not None else (os.cpu_count() or 1)
+        self.memory_budget = memory_budget
+        self.max_jobs = max_jobs
+        self._cpus = 0
+        self._memory = 0
+        self._jobs = 0
+        self._waiting: Deque[str] = deque()
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.generation = 0
+
+        self.validate_parameters()
+
+    def validate_parameters(self):
+        """
+        Validate the budgets.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if not isinstance(self.cpu_budget, int) or self.cpu_budget <= 0:
+            raise ValueError(f"Invalid cpu_budget: {self.cpu_budget}. Must be a positive integer.")
+
+        if self.memory_budget is not None and (not isinstance(self.memory_budget, int) or self.memory_budget <= 0):
+            raise ValueError(f"Invalid memory_budget: {self.memory_budget}. Must be a positive integer or None.")
+
+        if self.max_jobs is not None and (not isinstance(self.max_jobs, int) or self.max_jobs <= 0):
+            raise ValueError(f"Invalid max_jobs: {self.max_jobs}. Must be a positive integer or None.")
+
+    def _fits(self, cpus: int, memory: int) -> bool:
+        if self._jobs == 0:
+            return True
+        if self.max_jobs is not None and self._jobs >= self.max_jobs:
+            return False
+        if self._cpus + cpus > self.cpu_budget:
+            return False
+        return self.memory_budget is None or self._memory + memory <= self.memory_budget
+
+    def _publish(self):
+        Metrics.ADMISSION_WAITING.set(len(self._waiting))
+        Metrics.RESOURCES_RESERVED.labels('cpu').set(self._cpus)
+        Metrics.RESOURCES_RESERVED.labels('memory_bytes').set(self._memory)
+
+    def add_listener(self, callback: Callable[[], None]):
+        """
+        Register a callback run, without arguments, whenever waiting jobs may now be admitted.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _changed(self):
+        with self._lock:
+            self.generation += 1
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    def withdraw(self, job_id: str):
+        """
+        Give up the place in line of a job that will not be admitted, e.g. because it was cancelled.
+        """
+        with self._lock:
+            if job_id not in self._waiting:
+                return
+            self._waiting.remove(job_id)
+            self._publish()
+        self._changed()
+
+    @contextmanager
+    def admit(self, job: Job, cpus: int, memory: int = 0):
+        """
+        Reserve resources for the duration of a ``with`` block.
+
+        Args:
+            job (Job): Job to admit. Its stage shows ``admission`` while it waits.
+            cpus (int): CPU threads the job uses.
+            memory (int): Estimated peak memory of the job, in bytes.
+
+        Raises:
+            JobDeferred: If the resources are not free or earlier jobs are waiting. The job keeps
+                its place in line until it is admitted or withdrawn.
+        """
+        with self._lock:
+            if job.id not in self._waiting:
+                self._waiting.append(job.id)
+            admitted = self._waiting[0] == job.id and self._fits(cpus, memory)
+            if admitted:
+                self._waiting.popleft()
+                self._cpus += cpus
+                self._memory += memory
+                self._jobs += 1
+            self._publish()
+            generation = self.generation
+        if not admitted:
+            job.update('admission')
+            raise JobDeferred(job.id, generation)
+        if self._waiting:
+            # The next job in line may fit alongside this one.
+            self._changed()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._cpus -= cpus
+                self._memory -= memory
+                self._jobs -= 1
+                self._publish()
+            self._changed()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cpu_budget": self.cpu_budget, "memory_budget": self.memory_budget, "max_jobs": self.max_jobs,
+                    "cpus_reserved": self._cpus, "memory_reserved": self._memory, "running": self._jobs,
+                    "waiting": len(self._waiting)}
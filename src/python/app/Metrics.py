@@ -0,0 +1,262 @@
+import abc
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class _Metric(abc.ABC):
+    """
+    Base class of a labelled metric. Children per label combination are created on first use.
+    """
+
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """
+        Return the child metric for one combination of label values.
+        """
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {values}.")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """
+        Create the child metric holding the value of one label combination.
+        """
+
+    def _format_labels(self, values: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{self._format_labels(values)} {child.get()}"]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self._value
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, e.g. cache hits or bytes processed.
+    """
+
+    TYPE = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down, e.g. queue depth. Can read its value from a function.
+    """
+
+    TYPE = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self.labels().set_function(function)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets, e.g. stage durations.
+    """
+
+    TYPE = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                       120.0, 300.0, 600.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._format_labels(values, [('le', repr(float(bound)))])} {cumulative}")
+        cumulative += counts[-1]
+        lines.append(f"{self.name}_bucket{self._format_labels(values, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(values)} {total}")
+        lines.append(f"{self.name}_count{self._format_labels(values)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """
+    Context manager that observes the elapsed wall time on exit.
+    """
+
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram: _HistogramValue):
+        self._histogram = histogram
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Registry:
+    """
+    Collection of metrics rendered together in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Duplicate metric name: {metric.name}")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = Histogram('soundbuddy_stage_duration_seconds',
+                          'Time spent in each processing stage.', ('component', 'stage'))
+BYTES_PROCESSED = Counter('soundbuddy_bytes_processed_total',
+                          'Bytes of audio read or written, by component.', ('component', 'direction'))
+CACHE_REQUESTS = Counter('soundbuddy_cache_requests_total',
+                         'Cache lookups by cache and result (hit or miss).', ('cache', 'result'))
+JOBS_TOTAL = Counter('soundbuddy_jobs_total', 'Finished jobs by kind and final status.', ('kind', 'status'))
+JOB_QUEUE_SECONDS = Histogram('soundbuddy_job_queue_wait_seconds', 'Time jobs wait in the queue before running.',
+                              ('kind',))
+JOB_RUN_SECONDS = Histogram('soundbuddy_job_run_seconds', 'Time jobs spend running.', ('kind',))
+JOB_QUEUE_DEPTH = Gauge('soundbuddy_job_queue_depth', 'Jobs waiting in the queue.')
+JOBS_RUNNING = Gauge('soundbuddy_jobs_running', 'Jobs currently running.')
+ADMISSION_WAITING = Gauge('soundbuddy_admission_waiting', 'Jobs waiting for CPU or memory budget.')
+RESOURCES_RESERVED = Gauge('soundbuddy_resources_reserved', 'CPU threads and memory bytes reserved by admitted jobs.',
+                           ('resource',))
+
+
+def timed(component: str, stage: str) -> _Timer:
+    """
+    Time a block of code into the stage duration histogram.
+
+    Args:
+        component (str): Component the stage belongs to, e.g. ``BeatTracker``.
+        stage (str): Name of the stage, e.g. ``onset``.
+
+    Returns:
+        _Timer: Context manager recording the elapsed time.
+    """
+    return STAGE_SECONDS.labels(component, stage).time()
+
+
+def count_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def count_bytes(component: str, direction: str, amount: int):
+    BYTES_PROCESSED.labels(component, direction).inc(amount)
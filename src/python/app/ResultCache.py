@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import Metrics
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 digest of a file's contents.
+
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Least recently used digests, bounded so a long-running server does not keep one per file it ever saw.
+HASH_MEMO_MAX_ENTRIES = 4096
+_hash_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_hash_memo_lock = threading.Lock()
+
+
+def content_hash(file_path: str) -> str:
+    """
+    Hash the contents of a file, memoised on path, size and mtime so unchanged files are hashed once.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _hash_memo_lock:
+        cached = _hash_memo.get(memo_key)
+        if cached is not None:
+            _hash_memo.move_to_end(memo_key)
+    if cached is None:
+        with Metrics.timed('ResultCache', 'hash'):
+            cached = hash_file(file_path)
+        Metrics.count_bytes('ResultCache', 'read', stat.st_size)
+        with _hash_memo_lock:
+            _hash_memo[memo_key] = cached
+            _hash_memo.move_to_end(memo_key)
+            while len(_hash_memo) > HASH_MEMO_MAX_ENTRIES:
+                _hash_memo.popitem(last=False)
+    return cached
+
+
+class ResultCache:
+    """
+    On-disk, content-addressed cache for isolation stems and beat detection results.
+
+    Entries are keyed by a hash of the input audio contents plus the processing
+    parameters, so the same clip submitted under a different path still hits.
+    Each entry lives in its own folder with a ``meta.json`` file, which lets the
+    cache survive server restarts. Entries are evicted least-recently-used first
+    once the cache grows past ``max_bytes``, and expire after ``max_age`` seconds.
+
+    Attributes:
+        cache_dir (str): Folder holding the cache entries.
+        max_bytes (int): Size budget for all cached files, in bytes.
+        max_age (float): Maximum age of an entry since its last access, in seconds.
+    """
+
+    META_FILE = 'meta.json'
+    KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+    TMP_PATTERN = re.compile(r'^[0-9a-f]{64}\.tmp-')
+    # Unfinished writes younger than this may still belong to a live process.
+    TMP_GRACE = 3600.0
+
+    def __init__(self, cache_dir: str = 'cache', max_bytes: int = 10 * 1024 ** 3,
+                 max_age: float = 7 * 24 * 3600):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+        self.validate_parameters()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def validate_parameters(self):
+        """
+        Validate the cache limits.
+
+        Raises:
+            ValueError: If any limit is invalid.
+        """
+        if not isinstance(self.max_bytes, int) or self.max_bytes <= 0:
+            raise ValueError(f"Invalid max_bytes: {self.max_bytes}. Must be a positive integer.")
+
+        if not isinstance(self.max_age, (int, float)) or self.max_age <= 0:
+            raise ValueError(f"Invalid max_age: {self.max_age}. Must be a positive number.")
+
+    def _load_index(self):
+        # Only folders named like cache keys belong to the cache; anything else under the root is left alone.
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if self.TMP_PATTERN.match(name):
+                try:
+                    if now - os.stat(path).st_mtime > self.TMP_GRACE:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+                continue
+            if not self.KEY_PATTERN.match(name):
+                continue
+            try:
+                with open(os.path.join(path, self.META_FILE), 'r') as f:
+                    self._entries[name] = json.load(f)
+            except (OSError, ValueError):
+                try:
+                    if now - os.stat(path).st_mtime > self.TMP_GRACE:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+        self.evict()
+
+    def make_key(self, kind: str, file_path: str, params: Dict[str, Any]) -> str:
+        """
+        Build a cache key from the input contents and processing parameters.
+
+        Args:
+            kind (str): Type of result, e.g. ``'isolate'`` or ``'beats'``.
+            file_path (str): Path to the input audio file.
+            params (Dict[str, Any]): Parameters that affect the result.
+
+        Returns:
+            str: Cache key.
+        """
+        payload = json.dumps({"kind": kind, "audio": content_hash(file_path), "params": params},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cache entry and mark it as recently used.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            Optional[Dict[str, Any]]: The cached value, with ``files`` rewritten to absolute
+            paths inside the cache, or None on a miss.
+        """
+        with self._lock:
+            meta = self._entries.get(key)
+            if meta is None:
+                Metrics.count_cache('results', False)
+                return None
+
+            now = time.time()
+            entry_dir = self.entry_dir(key)
+            files = [os.path.join(entry_dir, name) for name in meta.get('files', [])]
+            if now - meta['last_access'] > self.max_age or not all(os.path.exists(f) for f in files):
+                self._remove(key)
+                Metrics.count_cache('results', False)
+                return None
+
+            Metrics.count_cache('results', True)
+            meta['last_access'] = now
+            self._write_meta(key, meta)
+            return {"value": meta['value'], "files": files}
+
+    def put(self, key: str, value: Any, files: Optional[List[str]] = None,
+            base_dir: Optional[str] = None) -> List[str]:
+        """
+        Store a result in the cache.
+
+        Files are hard-linked into the entry folder when possible, so caching stems
+        does not duplicate them on disk; otherwise they are copied.
+
+        Args:
+            key (str): Cache key.
+            value (Any): JSON-serialisable result.
+            files (Optional[List[str]]): Output files belonging to the result.
+            base_dir (Optional[str]): Folder the file layout is preserved relative to.
+
+        Returns:
+            List[str]: Paths of the cached files.
+        """
+        files = files or []
+        entry_dir = self.entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        names = []
+        size = 0
+        for file_path in files:
+            name = os.path.relpath(file_path, base_dir) if base_dir else os.path.basename(file_path)
+            target = os.path.join(tmp_dir, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _link_or_copy(file_path, target)
+            names.append(name)
+            size += os.path.getsize(target)
+
+        now = time.time()
+        meta = {"value": value, "files": names, "size": size, "created": now, "last_access": now}
+        with open(os.path.join(tmp_dir, self.META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+            self._entries[key] = meta
+            self.evict()
+
+        return [os.path.join(entry_dir, name) for name in names]
+
+    def restore(self, files: List[str], key: str, target_dir: str) -> List[str]:
+        """
+        Materialise cached files into a new output folder.
+
+        Args:
+            files (List[str]): Cached file paths returned by ``get``.
+            key (str): Cache key the files belong to.
+            target_dir (str): Folder to restore the files into.
+
+        Returns:
+            List[str]: Paths of the restored files.
+        """
+        entry_dir = self.entry_dir(key)
+        restored = []
+        for file_path in files:
+            target = os.path.join(target_dir, os.path.relpath(file_path, entry_dir))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _link_or_copy(file_path, target)
+            restored.append(target)
+        return restored
+
+    def evict(self):
+        """
+        Drop expired entries, then least-recently-used entries until under the size budget.
+        """
+        with self._lock:
+            now = time.time()
+            for key, meta in list(self._entries.items()):
+                if now - meta['last_access'] > self.max_age:
+                    self._remove(key)
+
+            total = sum(meta['size'] for meta in self._entries.values())
+            for key, meta in sorted(self._entries.items(), key=lambda item: item[1]['last_access']):
+                if total <= self.max_bytes:
+                    break
+                total -= meta['size']
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def _write_meta(self, key: str, meta: Dict[str, Any]):
+        meta_path = os.path.join(self.entry_dir(key), self.META_FILE)
+        tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+
+def _link_or_copy(source: str, target: str):
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import AudioDecoder
+import Metrics
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def describe_stem(path: str) -> Dict[str, Any]:
+    """
+    Return the manifest entry of a stem file: its name, path, format, size and, where it can be read, its audio layout.
+    """
+    name, extension = os.path.splitext(os.path.basename(path))
+    entry = {"name": name, "path": path, "format": extension.lstrip('.').lower(), "bytes": os.path.getsize(path)}
+    try:
+        import soundfile
+        info = soundfile.info(path)
+        entry.update(samplerate=info.samplerate, channels=info.channels, duration=info.duration)
+    except Exception:
+        pass
+    return entry
+
+
+def write_manifest(run_folder: str, stems: List[Dict[str, Any]], **fields) -> Dict[str, Any]:
+    """
+    Write ``manifest.json`` into a run folder.
+
+    Args:
+        run_folder (str): Run folder the stems belong to.
+        stems (List[Dict[str, Any]]): Entries from ``describe_stem``.
+        **fields: Extra fields to record, e.g. the model name.
+
+    Returns:
+        Dict[str, Any]: The manifest.
+    """
+    manifest = dict(fields, run_folder=run_folder, created=time.time(), stems=stems,
+                    bytes=sum(stem["bytes"] for stem in stems))
+    path = os.path.join(run_folder, MANIFEST_FILE)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(run_folder: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(run_folder, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class StemEncoder:
+    """
+    Encodes separated WAV stems to their delivery format on a shared thread pool.
+
+    ``flac`` and ``ogg`` are written with libsndfile, which releases the GIL while encoding,
+    so stems of one run are encoded side by side. ``mp3`` and ``m4a`` are encoded by ffmpeg
+    subprocesses. Blocks are streamed from the source WAV, which is removed once its encoded
+    copy is complete.
+
+    Attributes:
+        max_workers (int): Number of stems encoded at once.
+    """
+
+    SOUNDFILE_FORMATS = {'wav': None, 'flac': ('FLAC', 'PCM_16'), 'ogg': ('OGG', 'VORBIS')}
+    FFMPEG_FORMATS = {'mp3': ['-codec:a', 'libmp3lame', '-q:a', '2'], 'm4a': ['-codec:a', 'aac', '-b:a', '256k']}
+    VALID_FORMATS = set(SOUNDFILE_FORMATS) | set(FFMPEG_FORMATS)
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.validate_parameters()
+
+    def validate_parameters(self):
+        """
+        Validate the encoder configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if not isinstance(self.max_workers, int) or self.max_workers <= 0:
+            raise ValueError(f"Invalid max_workers: {self.max_workers}. Must be a positive integer.")
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stem-encoder')
+            return self._pool
+
+    def encode(self, files: Iterable[str], fmt: str = 'wav',
+               progress_callback: Optional[Callable[[str, float], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Encode WAV stems in parallel and describe the results.
+
+        Args:
+            files (Iterable[str]): Paths of the WAV stems.
+            fmt (str): Target format, one of ``VALID_FORMATS``. ``wav`` keeps the stems as they are.
+            progress_callback (Optional[Callable[[str, float], None]]): Called with ``encode`` and
+                the fraction of stems done.
+
+        Returns:
+            List[Dict[str, Any]]: Manifest entries of the encoded stems, in input order.
+
+        Raises:
+            ValueError: If the format is unknown.
+        """
+        if fmt not in self.VALID_FORMATS:
+            raise ValueError(f"Invalid format: {fmt}. Valid options are: {self.VALID_FORMATS}")
+        report = progress_callback or (lambda stage, fraction: None)
+        files = list(files)
+        if fmt == 'wav':
+            return [describe_stem(path) for path in files]
+
+        futures = [self._get_pool().submit(self._encode_one, path, fmt) for path in files]
+        stems = []
+        for index, future in enumerate(futures):
+            stems.append(future.result())
+            report('encode', (index + 1) / len(futures))
+        return stems
+
+    def _encode_one(self, path: str, fmt: str) -> Dict[str, Any]:
+        target = f"{os.path.splitext(path)[0]}.{fmt}"
+        tmp_target = f"{os.path.splitext(path)[0]}.tmp.{fmt}"
+        with Metrics.timed('StemEncoder', fmt):
+            if fmt in self.SOUNDFILE_FORMATS:
+                import soundfile
+                file_format, subtype = self.SOUNDFILE_FORMATS[fmt]
+                with soundfile.SoundFile(path) as source, \
+                        soundfile.SoundFile(tmp_target, 'w', source.samplerate, source.channels,
+                                            format=file_format, subtype=subtype) as output:
+                    for block in source.blocks(blocksize=1 << 16, dtype='float32'):
+                        output.write(block)
+            else:
+                ffmpeg = AudioDecoder.find_ffmpeg()
+                if ffmpeg is None:
+                    raise FileNotFoundError("ffmpeg not found. Place ffmpeg next to the server or add it to PATH.")
+                subprocess.run([ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y', '-i', path,
+                                *self.FFMPEG_FORMATS[fmt], '-f', 'mp4' if fmt == 'm4a' else fmt, tmp_target],
+                               check=True)
+        os.replace(tmp_target, target)
+        Metrics.count_bytes('StemEncoder', 'written', os.path.getsize(target))
+        os.remove(path)
+        return describe_stem(target)
+
+
+class RunRetention:
+    """
+    Retention policy that garbage-collects old run folders under an output folder.
+
+    Only folders holding a ``manifest.json`` are considered, so nothing the server did not
+    create is removed. Runs older than ``max_age`` are removed first, then the oldest runs
+    until the rest fit in ``max_bytes``. Either limit can be None to disable it.
+
+    Attributes:
+        max_age (Optional[float]): Maximum age of a run, in seconds.
+        max_bytes (Optional[int]): Size budget for all runs under one output folder, in bytes.
+    """
+
+    def __init__(self, max_age: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+        self.validate_parameters()
+
+    def validate_parameters(self):
+        """
+        Validate the policy.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if self.max_age is not None and (not isinstance(self.max_age, (int, float)) or self.max_age <= 0):
+            raise ValueError(f"Invalid max_age: {self.max_age}. Must be a positive number or None.")
+
+        if self.max_bytes is not None and (not isinstance(self.max_bytes, int) or self.max_bytes <= 0):
+            raise ValueError(f"Invalid max_bytes: {self.max_bytes}. Must be a positive integer or None.")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age is not None or self.max_bytes is not None
+
+    def collect(self, output_folder: str, keep: Iterable[str] = ()) -> List[str]:
+        """
+        Remove run folders that fall outside the policy.
+
+        Args:
+            output_folder (str): Folder holding the run folders.
+            keep (Iterable[str]): Run folders that must not be removed, e.g. ones still being written.
+                They still count towards ``max_bytes``.
+
+        Returns:
+            List[str]: Paths of the removed run folders.
+        """
+        if not self.enabled or not os.path.isdir(output_folder):
+            return []
+        keep = {os.path.abspath(path) for path in keep}
+        runs = []
+        for name in os.listdir(output_folder):
+            run_folder = os.path.abspath(os.path.join(output_folder, name))
+            manifest = read_manifest(run_folder)
+            if manifest is None:
+                continue
+            runs.append((manifest.get("created", 0.0), manifest.get("bytes", 0), run_folder))
+
+        now = time.time()
+        total = sum(size for _, size, _ in runs)
+        removed = []
+        for created, size, run_folder in sorted(runs):
+            if run_folder in keep:
+                continue
+            expired = self.max_age is not None and now - created > self.max_age
+            over_budget = self.max_bytes is not None and total > self.max_bytes
+            if not expired and not over_budget:
+                continue
+            shutil.rmtree(run_folder, ignore_errors=True)
+            total -= size
+            removed.append(run_folder)
+            Metrics.count_bytes('RunRetention', 'removed', size)
+        return removed
@@ -0,0 +1,421 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import Metrics
+from ResultCache import content_hash
+
+# Model and device set up once per worker process by ``_init_worker``.
+_worker_model = None
+_worker_device = 'cpu'
+
+
+def _init_worker(model_name: str, device: str, num_threads: int):
+    global _worker_model, _worker_device
+    import torch
+    from demucs.pretrained import get_model
+
+    torch.set_num_threads(num_threads)
+    if device == 'cuda' and not torch.cuda.is_available():
+        device = 'cpu'
+    _worker_device = device
+    _worker_model = get_model(model_name)
+    _worker_model.to(device)
+    _worker_model.eval()
+
+
+def _model_info() -> Tuple[int, List[str], int]:
+    return _worker_model.samplerate, list(_worker_model.sources), _worker_model.audio_channels
+
+
+def _separate_segment(input_path: str, start: int, end: int, mean: float, std: float, shifts: int,
+                      two_stems: Optional[str], segment_path: str) -> Dict[str, float]:
+    """
+    Separate ``[start, end)`` of a ``(channels, samples)`` ``.npy`` buffer and save the stems to ``segment_path``.
+
+    Returns:
+        Dict[str, float]: Peak amplitude of each stem, in the order they are saved.
+    """
+    import torch
+    from demucs.apply import apply_model
+    from demucs.audio import convert_audio_channels
+
+    model = _worker_model
+    wav = torch.from_numpy(np.array(np.load(input_path, mmap_mode='r')[:, start:end]))
+    wav = convert_audio_channels(wav, model.audio_channels)
+    wav = (wav - mean) / (std + 1e-8)
+    with torch.no_grad():
+        sources = apply_model(model, wav[None], device=_worker_device, shifts=shifts, split=True, overlap=0.25,
+                              progress=False)[0]
+    sources = (sources * std + mean).cpu().numpy()
+
+    stems = dict(zip(model.sources, sources))
+    if two_stems is not None:
+        stem = stems.pop(two_stems)
+        stems = {two_stems: stem, f"no_{two_stems}": sum(stems.values())}
+
+    tmp_path = f"{segment_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, np.stack(list(stems.values())).astype(np.float32))
+    os.replace(tmp_path, segment_path)
+    return {name: float(np.abs(stem).max(initial=0.0)) for name, stem in stems.items()}
+
+
+class SegmentedSeparator:
+    """
+    Demucs separation that splits long inputs into overlapping segments and separates them
+    in parallel worker processes.
+
+    Each worker loads the model once and is limited to ``threads_per_worker`` torch threads,
+    so a CPU-only machine runs several segments at the same time instead of one file on a
+    thread pool that stops scaling after a few cores. Workers read their segment straight
+    from the decoded ``.npy`` buffer and save the separated segment to disk, which keeps
+    peak memory at one segment per worker. A failed segment is resubmitted on its own. Once
+    all segments are done they are joined with linear crossfades over the overlap and written
+    with the CLI layout (``<out>/<model>/<track>/<stem>.wav``).
+
+    Segments are kept under ``work_root`` in a folder keyed by the file's content hash, the
+    model and the segmentation settings, so a job resubmitted after a crash or cancel only
+    separates the segments that are missing. The folder is removed once the stems are
+    written, and folders left by abandoned jobs are removed after ``work_max_age``.
+
+    Attributes:
+        model_name (str): Name of the pretrained Demucs model.
+        device (str): Torch device used by the workers. Workers fall back to cpu if CUDA is not available.
+        num_workers (int): Number of worker processes.
+        threads_per_worker (int): Torch intra-op thread count of each worker.
+        max_retries (int): Number of times a failed segment is resubmitted.
+        work_root (Optional[str]): Folder holding the segment work folders. If None, they are
+            kept under each run's output folder and cannot be resumed by another run.
+        work_max_age (float): Age in seconds after which an untouched work folder is removed.
+    """
+
+    VALID_DEVICES = {'cpu', 'cuda'}
+
+    def __init__(self, model_name: str = 'htdemucs', device: str = 'cpu', num_workers: Optional[int] = None,
+                 threads_per_worker: Optional[int] = None, max_retries: int = 2, work_root: Optional[str] = None,
+                 work_max_age: float = 24 * 3600.0):
+        cpu_count = os.cpu_count() or 1
+        self.model_name = model_name
+        self.device = device
+        self.num_workers = num_workers if num_workers is not None else max(1, cpu_count // 4)
+        self.threads_per_worker = threads_per_worker if threads_per_worker is not None else \
+            max(1, cpu_count // max(1, self.num_workers))
+        self.max_retries = max_retries
+        self.work_root = os.path.abspath(work_root) if work_root is not None else None
+        self.work_max_age = work_max_age
+        self._work_locks: Dict[str, threading.Lock] = {}
+        self._work_locks_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._model_info: Optional[Tuple[int, List[str], int]] = None
+
+        self.validate_parameters()
+
+    def validate_parameters(self):
+        """
+        Validate the separator configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if self.device not in self.VALID_DEVICES:
+            raise ValueError(f"Invalid device: {self.device}. Valid options are: {self.VALID_DEVICES}")
+
+        if not isinstance(self.num_workers, int) or self.num_workers <= 0:
+            raise ValueError(f"Invalid num_workers: {self.num_workers}. Must be a positive integer.")
+
+        if not isinstance(self.threads_per_worker, int) or self.threads_per_worker <= 0:
+            raise ValueError(f"Invalid threads_per_worker: {self.threads_per_worker}. Must be a positive integer.")
+
+        if not isinstance(self.max_retries, int) or self.max_retries < 0:
+            raise ValueError(f"Invalid max_retries: {self.max_retries}. Must be a non-negative integer.")
+
+        if not isinstance(self.work_max_age, (int, float)) or self.work_max_age <= 0:
+            raise ValueError(f"Invalid work_max_age: {self.work_max_age}. Must be a positive number.")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                with Metrics.timed('SegmentedSeparator', 'start_workers'):
+                    # Spawned explicitly: forking the threaded server after torch and OpenMP are
+                    # loaded can deadlock the child, and Windows only supports spawn anyway.
+                    self._pool = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                                     initargs=(self.model_name, self.device, self.threads_per_worker),
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _reset_pool(self, broken: ProcessPoolExecutor):
+        # Jobs sharing a broken pool all see it fail; only the first one to get here replaces it.
+        with self._pool_lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _work_lock(self, work_dir: str) -> threading.Lock:
+        with self._work_locks_lock:
+            return self._work_locks.setdefault(work_dir, threading.Lock())
+
+    def _work_dir(self, file_path: str, output_folder: str, segment_seconds: float, overlap_seconds: float,
+                  shifts: int, two_stems: Optional[str]) -> str:
+        if self.work_root is None:
+            return os.path.join(output_folder, '.segments', os.path.splitext(os.path.basename(file_path))[0])
+        name = f"{content_hash(file_path)}_{self.model_name}_{segment_seconds:g}_{overlap_seconds:g}_{shifts}_" \
+               f"{two_stems or 'all'}"
+        return os.path.join(self.work_root, name)
+
+    def collect_work(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Remove work folders under ``work_root`` that have not been touched for ``work_max_age``.
+
+        Args:
+            keep (Optional[str]): Work folder that must not be removed.
+
+        Returns:
+            List[str]: Paths of the removed folders.
+        """
+        if self.work_root is None or not os.path.isdir(self.work_root):
+            return []
+        removed = []
+        now = time.time()
+        for name in os.listdir(self.work_root):
+            path = os.path.join(self.work_root, name)
+            if path == keep or not os.path.isdir(path):
+                continue
+            try:
+                expired = now - os.stat(path).st_mtime > self.work_max_age
+            except OSError:
+                continue
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+        return removed
+
+    def model_info(self) -> Tuple[int, List[str], int]:
+        """
+        Return the model's sample rate, source names and channel count, as loaded by a worker.
+        """
+        if self._model_info is None:
+            self._model_info = self._get_pool().submit(_model_info).result()
+        return self._model_info
+
+    @staticmethod
+    def segment_bounds(length: int, segment: int, overlap: int) -> List[Tuple[int, int]]:
+        """
+        Split ``length`` samples into segments of ``segment`` samples that overlap by ``overlap``.
+
+        Returns:
+            List[Tuple[int, int]]: ``(start, end)`` sample bounds of each segment.
+        """
+        step = segment - overlap
+        bounds = [(0, min(segment, length))]
+        start = step
+        while start + overlap < length:
+            bounds.append((start, min(start + segment, length)))
+            start += step
+        return bounds
+
+    @staticmethod
+    def _reference_stats(audio: np.ndarray, channels: int, block: int = 1 << 20) -> Tuple[float, float]:
+        # Mean and std of the mono reference Demucs normalises by, computed block-wise so a
+        # memory-mapped buffer is never loaded whole.
+        used = audio[:channels] if audio.shape[0] >= channels else audio
+        total, total_sq, count = 0.0, 0.0, 0
+        for start in range(0, used.shape[1], block):
+            ref = np.asarray(used[:, start:start + block], dtype=np.float64).mean(axis=0)
+            total += ref.sum()
+            total_sq += np.square(ref).sum()
+            count += ref.size
+        mean = total / max(count, 1)
+        variance = total_sq / max(count, 1) - mean ** 2
+        return mean, float(np.sqrt(max(variance, 0.0) * count / max(count - 1, 1)))
+
+    def separate_file(self, file_path: str, output_folder: str, shifts: Optional[int] = 0,
+                      two_stems: Optional[str] = None, audio_store=None, segment_seconds: float = 60.0,
+                      overlap_seconds: float = 2.0,
+                      progress_callback: Optional[Callable[[str, float], None]] = None) -> List[str]:
+        """
+        Separate one audio file segment by segment and write the stems.
+
+        Args:
+            file_path (str): Path to the audio file.
+            output_folder (str): Run folder the stems are written under.
+            shifts (Optional[int]): Number of random shifts for equivariant stabilisation.
+            two_stems (Optional[str]): If set, only separate this stem from the rest.
+            audio_store (Optional[AudioStore]): Store to read the decoded audio from. If None, the file is decoded here.
+            segment_seconds (float): Length of each segment.
+            overlap_seconds (float): Overlap between neighbouring segments, crossfaded when joining.
+            progress_callback (Optional[Callable[[str, float], None]]): Called with the stage name
+                and the fraction of the file processed.
+
+        Returns:
+            List[str]: Paths of the written stem files.
+
+        Raises:
+            RuntimeError: If a segment still fails after ``max_retries`` retries.
+        """
+        if segment_seconds <= 0 or overlap_seconds < 0 or overlap_seconds * 2 >= segment_seconds:
+            raise ValueError(f"Invalid segment_seconds/overlap_seconds: {segment_seconds}/{overlap_seconds}. "
+                             "Overlap must be non-negative and under half the segment length.")
+        report = progress_callback or (lambda stage, fraction: None)
+
+        report('decode', 0.0)
+        samplerate, sources, audio_channels = self.model_info()
+        if two_stems is not None and two_stems not in sources:
+            raise ValueError(f"Stem {two_stems} is not provided by model {self.model_name}: {sources}")
+
+        track_folder = os.path.join(output_folder, self.model_name, os.path.splitext(os.path.basename(file_path))[0])
+        os.makedirs(track_folder, exist_ok=True)
+        work_dir = self._work_dir(file_path, output_folder, segment_seconds, overlap_seconds, shifts or 0, two_stems)
+        self.collect_work(keep=work_dir)
+
+        # Two jobs for the same work folder would separate the same segments twice and the
+        # first to finish would remove the folder under the other, so they take turns.
+        with self._work_lock(work_dir):
+            os.makedirs(work_dir, exist_ok=True)
+            # Touched so the folder of a running job is never collected as abandoned.
+            os.utime(work_dir)
+            with Metrics.timed('SegmentedSeparator', 'decode'):
+                if audio_store is not None:
+                    audio = audio_store.load(file_path, sr=samplerate)
+                    input_path = audio.filename
+                else:
+                    import AudioDecoder
+                    input_path = os.path.join(work_dir, 'input.npy')
+                    if not os.path.exists(input_path):
+                        y, _ = AudioDecoder.decode(file_path, sr=samplerate, channels=audio_channels)
+                        tmp_path = f"{input_path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+                        np.save(tmp_path, np.ascontiguousarray(y))
+                        os.replace(tmp_path, input_path)
+                    audio = np.load(input_path, mmap_mode='r')
+                mean, std = self._reference_stats(audio, audio_channels)
+
+            bounds = self.segment_bounds(audio.shape[1], int(segment_seconds * samplerate),
+                                         int(overlap_seconds * samplerate))
+            names = list(sources) if two_stems is None else [two_stems, f"no_{two_stems}"]
+            peaks = self._separate_segments(input_path, bounds, mean, std, shifts or 0, two_stems, work_dir,
+                                            names, report)
+
+            output_files = self._join_segments(bounds, work_dir, track_folder, names, peaks, samplerate, report)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        report('write', 1.0)
+        return output_files
+
+    def _segment_path(self, work_dir: str, index: int) -> str:
+        return os.path.join(work_dir, f"{index:05d}.npy")
+
+    def _separate_segments(self, input_path: str, bounds: List[Tuple[int, int]], mean: float, std: float,
+                           shifts: int, two_stems: Optional[str], work_dir: str, names: List[str],
+                           report: Callable[[str, float], None]) -> Dict[str, float]:
+        peaks = dict.fromkeys(names, 0.0)
+        pending = []
+        for index in range(len(bounds)):
+            segment_path = self._segment_path(work_dir, index)
+            if os.path.exists(segment_path):
+                segment = np.load(segment_path, mmap_mode='r')
+                for name, stem in zip(names, segment):
+                    peaks[name] = max(peaks[name], float(np.abs(stem).max(initial=0.0)))
+            else:
+                pending.append(index)
+
+        done = len(bounds) - len(pending)
+        attempts = dict.fromkeys(pending, 0)
+        futures = {}
+
+        def submit(index):
+            start, end = bounds[index]
+            pool = self._get_pool()
+            future = pool.submit(_separate_segment, input_path, start, end, mean, std, shifts,
+                                 two_stems, self._segment_path(work_dir, index))
+            futures[future] = (index, pool)
+
+        report('separate', 0.1 + 0.8 * done / len(bounds))
+        try:
+            with Metrics.timed('SegmentedSeparator', 'separate'):
+                for index in pending:
+                    submit(index)
+                while futures:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    resubmit = []
+                    for future in finished:
+                        index, pool = futures.pop(future)
+                        try:
+                            segment_peaks = future.result()
+                        except Exception as e:
+                            attempts[index] += 1
+                            if attempts[index] > self.max_retries:
+                                raise RuntimeError(f"Segment {index} of {len(bounds)} failed after "
+                                                   f"{attempts[index]} attempts: {e}") from e
+                            print(f"Segment {index} failed, retrying: {e}")
+                            resubmit.append(index)
+                            if isinstance(e, BrokenProcessPool):
+                                # The pool is unusable after a worker dies; every queued segment goes again.
+                                resubmit.extend(index for index, _ in futures.values())
+                                futures.clear()
+                                self._reset_pool(pool)
+                                break
+                            continue
+                        for name, peak in segment_peaks.items():
+                            peaks[name] = max(peaks[name], peak)
+                        done += 1
+                        report('separate', 0.1 + 0.8 * done / len(bounds))
+                    for index in resubmit:
+                        submit(index)
+        finally:
+            for future in futures:
+                future.cancel()
+        return peaks
+
+    def _join_segments(self, bounds: List[Tuple[int, int]], work_dir: str, track_folder: str, names: List[str],
+                       peaks: Dict[str, float], samplerate: int,
+                       report: Callable[[str, float], None]) -> List[str]:
+        import soundfile
+
+        # Like ``demucs --clip-mode rescale``: scale a stem down only if it would clip.
+        scales = np.array([1.0 / max(1.01 * peaks[name], 1.0) for name in names], dtype=np.float32)[:, None, None]
+        writers = []
+        output_files = []
+        tail = None
+        try:
+            for index, (start, end) in enumerate(bounds):
+                report('write', 0.9 + 0.1 * index / len(bounds))
+                with Metrics.timed('SegmentedSeparator', 'write'):
+                    segment = np.load(self._segment_path(work_dir, index)) * scales
+                    if not writers:
+                        for name in names:
+                            stem_path = os.path.join(track_folder, f"{name}.wav")
+                            writers.append(soundfile.SoundFile(stem_path, 'w', samplerate, segment.shape[1],
+                                                               subtype='PCM_16'))
+                            output_files.append(stem_path)
+
+                    if tail is not None and tail.shape[-1]:
+                        fade_in = (np.arange(tail.shape[-1], dtype=np.float32) + 0.5) / tail.shape[-1]
+                        segment[..., :tail.shape[-1]] = tail * (1 - fade_in) + segment[..., :tail.shape[-1]] * fade_in
+                    if index + 1 < len(bounds):
+                        overlap = end - bounds[index + 1][0]
+                        tail = segment[..., segment.shape[-1] - overlap:].copy()
+                        segment = segment[..., :segment.shape[-1] - overlap]
+
+                    for writer, stem in zip(writers, segment):
+                        writer.write(np.clip(stem, -1.0, 1.0).T)
+        finally:
+            for writer in writers:
+                writer.close()
+        for stem_path in output_files:
+            Metrics.count_bytes('SegmentedSeparator', 'written', os.path.getsize(stem_path))
+        return output_files
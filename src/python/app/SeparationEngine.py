@@ -0,0 +1,211 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+import Metrics
+
+
+_cuda_available: Optional[bool] = None
+
+
+def resolve_device(device: str) -> str:
+    """
+    Return ``device``, or ``'cpu'`` if CUDA is requested but not available.
+    """
+    global _cuda_available
+    if device != 'cuda':
+        return device
+    if _cuda_available is None:
+        import torch
+        _cuda_available = torch.cuda.is_available()
+    return 'cuda' if _cuda_available else 'cpu'
+
+
+class SeparationEngine:
+    """
+    Long-lived, in-process Demucs engine that keeps loaded models warm across requests.
+
+    Running the ``demucs`` CLI per request pays for interpreter startup, the torch import
+    and model weight loading every time. The engine imports torch and Demucs once and keeps
+    up to ``max_models`` models resident, evicting the least recently used one when a new
+    model has to be loaded. Output follows the CLI layout (``<out>/<model>/<track>/<stem>.wav``)
+    so callers do not need to change how they collect stems.
+
+    Attributes:
+        device (str): Torch device used for inference.
+        max_models (int): Number of models kept loaded at once.
+        num_threads (Optional[int]): Torch intra-op thread count. If None, torch's default is kept.
+        num_workers (int): Number of workers Demucs uses to process split chunks.
+    """
+
+    VALID_DEVICES = {'cpu', 'cuda'}
+
+    def __init__(self, device: str = 'cpu', max_models: int = 2, num_threads: Optional[int] = None,
+                 num_workers: int = 0):
+        self.device = device
+        self.max_models = max_models
+        self.num_threads = num_threads
+        self.num_workers = num_workers
+        self._models: "OrderedDict[str, object]" = OrderedDict()
+        self._model_locks: Dict[str, threading.Lock] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._torch = None
+
+        self.validate_parameters()
+
+    def validate_parameters(self):
+        """
+        Validate the engine configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        if self.device not in self.VALID_DEVICES:
+            raise ValueError(f"Invalid device: {self.device}. Valid options are: {self.VALID_DEVICES}")
+
+        if not isinstance(self.max_models, int) or self.max_models <= 0:
+            raise ValueError(f"Invalid max_models: {self.max_models}. Must be a positive integer.")
+
+        if self.num_threads is not None and (not isinstance(self.num_threads, int) or self.num_threads <= 0):
+            raise ValueError(f"Invalid num_threads: {self.num_threads}. Must be a positive integer or None.")
+
+        if not isinstance(self.num_workers, int) or self.num_workers < 0:
+            raise ValueError(f"Invalid num_workers: {self.num_workers}. Must be a non-negative integer.")
+
+    def _import_torch(self):
+        if self._torch is None:
+            import torch
+            if self.num_threads is not None:
+                torch.set_num_threads(self.num_threads)
+            if self.device == 'cuda' and not torch.cuda.is_available():
+                print("CUDA is not available, running the separation engine on cpu.")
+                self.device = 'cpu'
+            self._torch = torch
+        return self._torch
+
+    def get_model(self, model_name: str):
+        """
+        Return a loaded model, loading it on first use and evicting the least recently used one.
+        Concurrent first uses of a model wait for one load instead of each loading a copy.
+
+        Args:
+            model_name (str): Name of the pretrained Demucs model.
+
+        Returns:
+            The loaded Demucs model.
+        """
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is not None:
+                self._models.move_to_end(model_name)
+                return model
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is not None:
+                    self._models.move_to_end(model_name)
+                    return model
+
+            self._import_torch()
+            from demucs.pretrained import get_model
+
+            with Metrics.timed('SeparationEngine', 'load_model'):
+                model = get_model(model_name)
+            model.to(self.device)
+            model.eval()
+
+            with self._lock:
+                self._models[model_name] = model
+                self._models.move_to_end(model_name)
+                self._model_locks.setdefault(model_name, threading.Lock())
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    print(f"Unloaded Demucs model: {evicted}")
+        return model
+
+    def preload(self, model_names: Iterable[str]):
+        """
+        Load models ahead of the first request.
+
+        Args:
+            model_names (Iterable[str]): Names of the models to load.
+        """
+        for model_name in model_names:
+            self.get_model(model_name)
+
+    def loaded_models(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+    def separate_file(self, file_path: str, model_name: str, output_folder: str, shifts: Optional[int] = 0,
+                      two_stems: Optional[str] = None, audio_store=None,
+                      progress_callback: Optional[Callable[[str, float], None]] = None) -> List[str]:
+        """
+        Separate one audio file with a warm model and write the stems.
+
+        Args:
+            file_path (str): Path to the audio file.
+            model_name (str): Name of the pretrained Demucs model.
+            output_folder (str): Run folder the stems are written under.
+            shifts (Optional[int]): Number of random shifts for equivariant stabilisation.
+            two_stems (Optional[str]): If set, only separate this stem from the rest.
+            audio_store (Optional[AudioStore]): Store to read the decoded audio from. If None, the file is decoded here.
+            progress_callback (Optional[Callable[[str, float], None]]): Called with the stage name
+                and the fraction of the file processed.
+
+        Returns:
+            List[str]: Paths of the written stem files.
+        """
+        report = progress_callback or (lambda stage, fraction: None)
+        torch = self._import_torch()
+        from demucs.apply import apply_model
+        from demucs.audio import convert_audio_channels, save_audio
+
+        report('decode', 0.0)
+        model = self.get_model(model_name)
+        if two_stems is not None and two_stems not in model.sources:
+            raise ValueError(f"Stem {two_stems} is not provided by model {model_name}: {model.sources}")
+
+        with Metrics.timed('SeparationEngine', 'decode'):
+            if audio_store is not None:
+                wav = torch.from_numpy(np.array(audio_store.load(file_path, sr=model.samplerate)))
+                wav = convert_audio_channels(wav, model.audio_channels)
+            else:
+                import AudioDecoder
+                y, _ = AudioDecoder.decode(file_path, sr=model.samplerate, channels=model.audio_channels)
+                wav = torch.from_numpy(np.ascontiguousarray(y))
+        ref = wav.mean(0)
+        mean, std = ref.mean(), ref.std()
+        wav = (wav - mean) / (std + 1e-8)
+
+        report('separate', 0.1)
+        with self._model_locks[model_name], torch.no_grad(), Metrics.timed('SeparationEngine', 'inference'):
+            sources = apply_model(model, wav[None], device=self.device, shifts=shifts or 0, split=True,
+                                  overlap=0.25, progress=False, num_workers=self.num_workers)[0]
+        sources = sources * std + mean
+
+        stems = dict(zip(model.sources, sources))
+        if two_stems is not None:
+            stem = stems.pop(two_stems)
+            rest = sum(stems.values())
+            stems = {two_stems: stem, f"no_{two_stems}": rest}
+
+        track_folder = os.path.join(output_folder, model_name, os.path.splitext(os.path.basename(file_path))[0])
+        os.makedirs(track_folder, exist_ok=True)
+
+        output_files = []
+        for index, (name, source) in enumerate(stems.items()):
+            report('write', 0.9 + 0.1 * index / len(stems))
+            stem_path = os.path.join(track_folder, f"{name}.wav")
+            with Metrics.timed('SeparationEngine', 'write'):
+                save_audio(source.cpu(), stem_path, samplerate=model.samplerate)
+            Metrics.count_bytes('SeparationEngine', 'written', os.path.getsize(stem_path))
+            output_files.append(stem_path)
+        report('write', 1.0)
+        return output_files
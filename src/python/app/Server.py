@@ -1,76 +1,598 @@
+import os
+
+# Persist numba's JIT cache for librosa's kernels across restarts. Must be set before numba is imported,
+# and must live outside the result cache root, whose index sweep removes folders it does not own.
+os.environ.setdefault('NUMBA_CACHE_DIR', os.environ.get(
+    'SOUNDBUDDY_NUMBA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'numba_cache')))
+
+import multiprocessing
 import sys
+import threading
+import uuid
 from flask import Flask, jsonify, request, Response
 import time
 import AudioIsolation as AudioIsolation
-import BeatDetection as BeatDetection
+import ResultCache as ResultCache
+import RunOutput as RunOutput
+import JobQueue as JobQueue
+import Metrics as Metrics
 import initialize as initialize
 import logging
 
+# librosa, scipy, numba and torch are slow to import, so modules that pull them in are loaded
+# lazily (or by the warm-up thread) instead of at server start:
+#   BeatDetection, AudioStore, FeatureCache, SeparationEngine, SegmentedSeparator, WaveformPeaks
+
 # Setup logging
 logging.basicConfig(filename='server.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s:%(message)s')
 
 app = Flask(__name__)
-progress = 0
+
+# Worker processes are spawned, and spawn re-imports the main script as ``__mp_main__`` in each
+# of them. Only the serving process sweeps the cache, starts job threads and warms up.
+IS_SERVER_PROCESS = multiprocessing.parent_process() is None
+
+CACHE_DIR = os.environ.get('SOUNDBUDDY_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+CACHE_MAX_BYTES = int(os.environ.get('SOUNDBUDDY_CACHE_MAX_BYTES', 10 * 1024 ** 3))
+CACHE_MAX_AGE = float(os.environ.get('SOUNDBUDDY_CACHE_MAX_AGE', 7 * 24 * 3600))
+result_cache = ResultCache.ResultCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE) \
+    if IS_SERVER_PROCESS else None
+
+AUDIO_STORE_DIR = os.environ.get('SOUNDBUDDY_AUDIO_STORE_DIR',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_store'))
+AUDIO_STORE_MAX_BYTES = int(os.environ.get('SOUNDBUDDY_AUDIO_STORE_MAX_BYTES', 20 * 1024 ** 3))
+# Kept outside CACHE_DIR, whose index sweep removes folders that are not result cache entries.
+FEATURE_CACHE_DIR = os.environ.get('SOUNDBUDDY_FEATURE_CACHE_DIR',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feature_cache'))
+FEATURE_CACHE_MAX_BYTES = int(os.environ.get('SOUNDBUDDY_FEATURE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+audio_store = None
+feature_cache = None
+waveform_peaks = None
+stores_lock = threading.Lock()
+
+
+def get_audio_store():
+    """Return the shared decoded audio store, creating it on first use."""
+    global audio_store
+    with stores_lock:
+        if audio_store is None:
+            import AudioStore
+            audio_store = AudioStore.AudioStore(AUDIO_STORE_DIR, max_bytes=AUDIO_STORE_MAX_BYTES)
+        return audio_store
+
+
+def get_feature_cache():
+    """Return the shared beat feature cache, creating it on first use."""
+    global feature_cache
+    with stores_lock:
+        if feature_cache is None:
+            import FeatureCache
+            feature_cache = FeatureCache.FeatureCache(FEATURE_CACHE_DIR, max_bytes=FEATURE_CACHE_MAX_BYTES)
+        return feature_cache
+
+
+def get_waveform_peaks():
+    """Return the waveform peak pyramid builder, creating it on first use."""
+    global waveform_peaks
+    store = get_audio_store()
+    with stores_lock:
+        if waveform_peaks is None:
+            import WaveformPeaks
+            waveform_peaks = WaveformPeaks.WaveformPeaks(store)
+        return waveform_peaks
+
+ENGINE_MAX_MODELS = int(os.environ.get('SOUNDBUDDY_ENGINE_MAX_MODELS', 2))
+ENGINE_THREADS = int(os.environ['SOUNDBUDDY_ENGINE_THREADS']) if 'SOUNDBUDDY_ENGINE_THREADS' in os.environ else None
+separation_engines = {}
+engines_lock = threading.Lock()
+
+
+def get_separation_engine(device):
+    """Return the warm separation engine for a device, creating it on first use."""
+    import SeparationEngine
+    # Keyed by the device actually used, so 'cuda' on a cpu-only machine shares the cpu engine.
+    device = SeparationEngine.resolve_device(device)
+    with engines_lock:
+        engine = separation_engines.get(device)
+        if engine is None:
+            engine = SeparationEngine.SeparationEngine(device=device, max_models=ENGINE_MAX_MODELS,
+                                                       num_threads=ENGINE_THREADS)
+            separation_engines[device] = engine
+        return engine
+
+
+SEGMENT_WORKERS = int(os.environ['SOUNDBUDDY_SEGMENT_WORKERS']) if 'SOUNDBUDDY_SEGMENT_WORKERS' in os.environ else None
+SEGMENT_THREADS = int(os.environ['SOUNDBUDDY_SEGMENT_THREADS']) if 'SOUNDBUDDY_SEGMENT_THREADS' in os.environ else None
+# Segments of interrupted runs are kept here so a resubmitted job can pick up where it stopped.
+SEGMENT_WORK_DIR = os.environ.get('SOUNDBUDDY_SEGMENT_WORK_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'segment_work'))
+segmented_separators = {}
+
+
+def get_segmented_separator(model_name, device):
+    """Return the segmented separator for a model and device, starting its worker processes on first use."""
+    import SeparationEngine
+    device = SeparationEngine.resolve_device(device)
+    with engines_lock:
+        separator = segmented_separators.get((model_name, device))
+        if separator is None:
+            import SegmentedSeparator
+            separator = SegmentedSeparator.SegmentedSeparator(model_name, device=device, num_workers=SEGMENT_WORKERS,
+                                                              threads_per_worker=SEGMENT_THREADS,
+                                                              work_root=SEGMENT_WORK_DIR)
+            segmented_separators[(model_name, device)] = separator
+        return separator
+
+
+ENCODE_WORKERS = int(os.environ.get('SOUNDBUDDY_ENCODE_WORKERS', 4))
+stem_encoder = RunOutput.StemEncoder(max_workers=ENCODE_WORKERS)
+
+# Run folders are only garbage-collected when a limit is configured.
+RUN_MAX_AGE = float(os.environ['SOUNDBUDDY_RUN_MAX_AGE']) if 'SOUNDBUDDY_RUN_MAX_AGE' in os.environ else None
+RUN_MAX_BYTES = int(os.environ['SOUNDBUDDY_RUN_MAX_BYTES']) if 'SOUNDBUDDY_RUN_MAX_BYTES' in os.environ else None
+run_retention = RunOutput.RunRetention(max_age=RUN_MAX_AGE, max_bytes=RUN_MAX_BYTES)
+
+# Separation jobs reserve CPU threads and an estimate of their peak memory before they start.
+CPU_BUDGET = int(os.environ.get('SOUNDBUDDY_CPU_BUDGET', os.cpu_count() or 1))
+if 'SOUNDBUDDY_MEMORY_BUDGET' in os.environ:
+    MEMORY_BUDGET = int(os.environ['SOUNDBUDDY_MEMORY_BUDGET'])
+else:
+    MEMORY_BUDGET = int(JobQueue.total_memory() * 0.75) if JobQueue.total_memory() else None
+MAX_SEPARATIONS = int(os.environ['SOUNDBUDDY_MAX_SEPARATIONS']) if 'SOUNDBUDDY_MAX_SEPARATIONS' in os.environ else None
+SEPARATION_MODEL_MEMORY = int(os.environ.get('SOUNDBUDDY_SEPARATION_MODEL_MEMORY', 2 * 1024 ** 3))
+JOB_WORKERS = int(os.environ.get('SOUNDBUDDY_JOB_WORKERS', 2))
+admission = None
+job_queue = None
+if IS_SERVER_PROCESS:
+    admission = JobQueue.AdmissionControl(cpu_budget=CPU_BUDGET, memory_budget=MEMORY_BUDGET,
+                                          max_jobs=MAX_SEPARATIONS)
+    # Jobs that do not fit the budgets are parked rather than holding a worker while they wait.
+    job_queue = JobQueue.JobQueue(max_workers=JOB_WORKERS, admission=admission)
+    Metrics.JOB_QUEUE_DEPTH.set_function(job_queue.pending)
+PROGRESS_KEEPALIVE = 15.0
+MAX_LONG_POLL = 60.0
+
+
+def separation_cost(file_path, segmenter=None, segment_seconds=None):
+    """
+    Estimate the CPU threads and peak memory of separating a file.
+
+    Memory is the model plus the decoded input, the stems and working buffers at 44.1 kHz stereo
+    float32, for the whole file or, when segmented, for one segment per worker.
+    """
+    if segmenter is not None:
+        cpus = segmenter.num_workers * segmenter.threads_per_worker
+        seconds = segmenter.num_workers * segment_seconds
+        return cpus, segmenter.num_workers * SEPARATION_MODEL_MEMORY + int(seconds * 44100 * 2 * 4 * 8)
+
+    try:
+        import AudioDecoder
+        _, _, seconds = AudioDecoder.probe(file_path)
+    except (OSError, ValueError):
+        seconds = None
+    if seconds is None:
+        # Roughly 1 MB per 10 s of compressed audio.
+        seconds = os.path.getsize(file_path) / 100_000
+    cpus = min(ENGINE_THREADS or CPU_BUDGET, CPU_BUDGET)
+    return cpus, SEPARATION_MODEL_MEMORY + int(seconds * 44100 * 2 * 4 * 8)
+
+
+def run_isolation(job, data):
+    model_name = data.get('model_name', 'htdemucs')
+    device = data.get('device', 'cuda')
+    shifts = data.get('shifts', 0)
+    two_stems = data.get('two_stems', None)
+    output_folder = data.get('output_folder', 'output')
+    segment_seconds = data.get('segment_seconds', None)
+    overlap_seconds = data.get('overlap_seconds', 2.0)
+    stem_format = data.get('stem_format', 'wav')
+    valid_formats = RunOutput.StemEncoder.VALID_FORMATS
+    if stem_format not in valid_formats:
+        raise ValueError(f"Invalid stem_format: {stem_format}. Valid options are: {valid_formats}")
+
+    params = {"model_name": model_name, "shifts": shifts, "two_stems": two_stems, "stem_format": stem_format}
+    if segment_seconds:
+        params.update(segment_seconds=segment_seconds, overlap_seconds=overlap_seconds)
+    job.update('cache', 0)
+    cache_key = result_cache.make_key('isolate', data['file_path'], params)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        run_folder = os.path.join(os.path.abspath(output_folder), str(uuid.uuid4()))
+        output_files = result_cache.restore(cached['files'], cache_key, run_folder)
+        manifest = RunOutput.write_manifest(run_folder, [RunOutput.describe_stem(path) for path in output_files],
+                                            source=data['file_path'], model_name=model_name, format=stem_format)
+        collect_runs(job, output_folder, run_folder)
+        logging.info("Isolation served from cache.")
+        return {"message": "Isolation complete.", "output_files": output_files, "manifest": manifest,
+                "cached": True}
+
+    if segment_seconds:
+        segmenter = get_segmented_separator(model_name, device)
+        backend = {"segmenter": segmenter, "segment_seconds": segment_seconds, "overlap_seconds": overlap_seconds}
+        cpus, memory = separation_cost(data['file_path'], segmenter, segment_seconds)
+    else:
+        backend = {"engine": get_separation_engine(device)}
+        cpus, memory = separation_cost(data['file_path'])
+
+    job.update('admission', 1)
+    with admission.admit(job, cpus, memory):
+        job.update('decode', 2)
+        isolator = AudioIsolation.Isolator(data['file_path'], audio_store=get_audio_store())
+        logging.info("Isolator created.")
+        output_files = isolator.process_audio(model_name=model_name, device=device, shifts=shifts,
+                                              two_stems=two_stems, output_folder=output_folder,
+                                              stem_format=stem_format, encoder=stem_encoder,
+                                              progress_callback=job.progress_callback(10, 98), **backend)
+    if output_files:
+        result_cache.put(cache_key, {"model_name": model_name}, files=output_files, base_dir=isolator.run_folder)
+    collect_runs(job, output_folder, isolator.run_folder)
+    logging.info("Isolation complete.")
+    return {"message": "Isolation complete.", "output_files": output_files, "manifest": isolator.manifest}
+
+
+def collect_runs(job, output_folder, run_folder):
+    """Apply the run folder retention policy to an output folder, keeping the run just written."""
+    if not run_retention.enabled:
+        return
+    job.update('cleanup', 98)
+    with Metrics.timed('Server', 'collect_runs'):
+        removed = run_retention.collect(os.path.abspath(output_folder), keep=[run_folder])
+    if removed:
+        logging.info(f"Removed {len(removed)} old run folders from {output_folder}.")
+
+
+def run_peaks(job, data):
+    job.update('decode', 5)
+    entry = get_waveform_peaks().pyramid(data['file_path'])
+    return {"message": "Waveform peaks ready.", "levels": len(entry["samples_per_peak"])}
+
+
+def run_beat_detection(job, data):
+    import BeatDetection
+    hop_length = data.get('hop_length', 512)
+    sr = data.get('sr', 22050)
+    start_bpm = data.get('start_bpm', 120)
+    tightness = data.get('tightness', 100.0)
+    stream = bool(data.get('stream', False))
+
+    job.update('cache', 0)
+    cache_key = result_cache.make_key('beats', data['file_path'],
+                                      {"hop_length": hop_length, "sr": sr, "start_bpm": start_bpm,
+                                       "tightness": tightness, "trim": not stream, "stream": stream})
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        logging.info("Beat detection served from cache.")
+        results = [dict(result, file_path=data['file_path']) for result in cached['value']]
+        return {"message": "Beat detection completed successfully.", "results": results, "cached": True}
+
+    beat_rec = BeatDetection.BeatTracker(audio_files=[data['file_path']],
+                                   hop_length=hop_length, 
+                                   sr=sr, start_bpm=start_bpm,
+                                   tightness=tightness, audio_store=get_audio_store(),
+                                   feature_cache=get_feature_cache())
+    if stream:
+        # Publish beats as each window is tracked so the panel can place markers early.
+        beat_times = []
+        job.partial = {"file_path": data['file_path'], "beat_times": beat_times}
+        for window in beat_rec.iter_beats_streaming(data['file_path'], progress_callback=job.progress_callback(5, 100)):
+            beat_times.extend(window["beat_times"])
+            job.notify()
+        results = [{"file_path": data['file_path'], "beat_times": beat_times}]
+    else:
+        results = beat_rec.track_beats(progress_callback=job.progress_callback(5, 100))
+    result_cache.put(cache_key, results)
+    logging.info("Beat detection completed.")
+    return {"message": "Beat detection completed successfully.", "results": results}
+
+
+def run_beat_sweep(job, data):
+    import BeatDetection
+    beat_rec = BeatDetection.BeatTracker(hop_length=data.get('hop_length', 512), sr=data.get('sr', 22050),
+                                         start_bpm=data.get('start_bpm', 120), tightness=data.get('tightness', 100.0),
+                                         audio_store=get_audio_store(), feature_cache=get_feature_cache())
+    tightness_values = data.get('tightness_values', [beat_rec.tightness])
+    start_bpm_values = data.get('start_bpm_values', [beat_rec.start_bpm])
+    hop_lengths = data.get('hop_lengths', [beat_rec.hop_length])
+    for name, values in (('tightness_values', tightness_values), ('start_bpm_values', start_bpm_values)):
+        if not values or not all(isinstance(v, (int, float)) and v > 0 for v in values):
+            raise ValueError(f"Invalid {name}: {values}. Must be a non-empty list of positive numbers.")
+    if not hop_lengths or not all(isinstance(v, int) and v > 0 for v in hop_lengths):
+        raise ValueError(f"Invalid hop_lengths: {hop_lengths}. Must be a non-empty list of positive integers.")
+
+    job.update('onset', 5)
+    results = beat_rec.sweep(data['file_path'], tightness_values, start_bpm_values, hop_lengths)
+    logging.info(f"Beat sweep completed with {len(results)} parameter combinations.")
+    return {"message": "Beat sweep completed successfully.", "file_path": data['file_path'], "results": results}
+
+
+BATCH_WORKERS = int(os.environ['SOUNDBUDDY_BATCH_WORKERS']) if 'SOUNDBUDDY_BATCH_WORKERS' in os.environ else None
+batch_pool = None
+batch_pool_lock = threading.Lock()
+
+
+def get_batch_pool():
+    """Return the shared beat detection process pool, creating it on first use."""
+    global batch_pool
+    with batch_pool_lock:
+        if batch_pool is None:
+            import BeatDetection
+            batch_pool = BeatDetection.create_worker_pool(BATCH_WORKERS)
+        return batch_pool
+
+
+def reset_batch_pool(broken):
+    """Replace the shared beat detection pool after a worker died, unless another job already has."""
+    global batch_pool
+    with batch_pool_lock:
+        if batch_pool is broken:
+            batch_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch_beat_detection(job, data):
+    import BeatDetection
+    params = {"hop_length": data.get('hop_length', 512), "sr": data.get('sr', 22050),
+              "start_bpm": data.get('start_bpm', 120), "tightness": data.get('tightness', 100.0)}
+    file_paths = data['file_paths']
+
+    # Results are published on the job as each file finishes.
+    results = []
+    job.partial = {"results": results}
+    job.update('cache', 0)
+    pending = []
+    cache_keys = {}
+    for file_path in file_paths:
+        try:
+            cache_keys[file_path] = result_cache.make_key('beats', file_path, dict(params, trim=True, stream=False))
+        except OSError as e:
+            results.append({"file_path": file_path, "error": str(e)})
+            continue
+        cached = result_cache.get(cache_keys[file_path])
+        if cached is not None:
+            results.extend(dict(result, file_path=file_path) for result in cached['value'])
+        else:
+            pending.append(file_path)
+
+    job.update('track', 100 * len(results) / len(file_paths))
+    beat_rec = BeatDetection.BeatTracker(audio_files=pending, audio_store=get_audio_store(),
+                                         feature_cache=get_feature_cache(), **params)
+    for result in beat_rec.track_beats_parallel(executor=get_batch_pool(), on_broken=reset_batch_pool):
+        if 'error' not in result:
+            result_cache.put(cache_keys[result['file_path']], [result])
+        results.append(result)
+        job.update('track', 100 * len(results) / len(file_paths))
+
+    failed = sum(1 for result in results if 'error' in result)
+    logging.info(f"Batch beat detection completed: {len(results) - failed} succeeded, {failed} failed.")
+    response = {"message": "Batch beat detection completed.", "results": results, "failed": failed}
+    if data.get('bulk_output'):
+        job.update('write', 99)
+        response["bulk_output"] = beat_rec.save_beat_times_bulk(results, data['bulk_output'])
+    return response
+
+
+def submit_job(fn, kind, data, required='file_path'):
+    if not data or required not in data:
+        return jsonify({"error": f"{required} is required."}), 400
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": f"Invalid priority: {data.get('priority')}. Must be an integer."}), 400
+    job = job_queue.submit(fn, kind, priority, data)
+    logging.info(f"Queued {kind} job {job.id}.")
+    return jsonify(job.to_dict()), 202
+
+PRELOAD_MODELS = [name for name in os.environ.get('SOUNDBUDDY_PRELOAD_MODELS', '').split(',') if name]
+# Same default as /isolate, so the preloaded engine is the one requests use.
+PRELOAD_DEVICE = os.environ.get('SOUNDBUDDY_PRELOAD_DEVICE', 'cuda')
+warmup_state = {"ready": False, "started": None, "finished": None, "error": None}
+
+
+def warm_up():
+    """
+    Import the heavy audio modules and compile librosa's numba kernels in the background,
+    so the server can bind and answer health checks immediately. Models listed in
+    ``SOUNDBUDDY_PRELOAD_MODELS`` are loaded afterwards, still off the serving threads.
+    """
+    warmup_state["started"] = time.time()
+    try:
+        get_audio_store()
+        get_feature_cache()
+        import BeatDetection
+        BeatDetection.warm_up()
+        warmup_state["ready"] = True
+        logging.info(f"Warm-up finished in {time.time() - warmup_state['started']:.2f}s.")
+        if PRELOAD_MODELS:
+            get_separation_engine(PRELOAD_DEVICE).preload(PRELOAD_MODELS)
+            logging.info(f"Preloaded models: {', '.join(PRELOAD_MODELS)}.")
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        logging.error(f"Error during warm-up: {e}")
+    finally:
+        warmup_state["finished"] = time.time()
+
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+@app.route('/health')
+def health():
+    modules = {name: name in sys.modules for name in ('librosa', 'numba', 'torch', 'demucs')}
+    engines = {device: engine.loaded_models() for device, engine in list(separation_engines.items())}
+    segmenters = [f"{model_name}/{device}" for model_name, device in list(segmented_separators)]
+    return jsonify({"status": "ok", "ready": warmup_state["ready"], "warmup": warmup_state,
+                    "modules": modules, "loaded_models": engines, "segmented_separators": segmenters,
+                    "pending_jobs": job_queue.pending(), "admission": admission.status()})
+
+@app.route('/metrics')
+def metrics():
+    return Response(Metrics.REGISTRY.render(), mimetype=Metrics.CONTENT_TYPE)
 
 @app.route('/progress')
 def progress_stream():
+    job = job_queue.get(request.args.get('job_id', ''))
+    if job is None:
+        return jsonify({"error": "Unknown job_id."}), 404
+
     def generate():
-        global progress
-        while progress < 100:
-            time.sleep(0.1)
-            yield f"data:{progress}\n\n"
-        yield f"data:{progress}\n\n"
-    return Response(generate(), mimetype='text/event-stream')
+        # Woken by the job on every change; the timeout only sends keep-alive comments.
+        version = -1
+        while True:
+            current = job.wait(version, timeout=PROGRESS_KEEPALIVE)
+            if current == version and not job.done:
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            yield f"data:{job.progress:.1f}\n\n"
+            if job.done:
+                break
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict(include_result=False) for job in job_queue.list()],
+                    "pending": job_queue.pending()})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id."}), 404
+    since = request.args.get('since', type=int)
+    if since is not None:
+        # Long poll: answer as soon as the job changes after the version the client has seen.
+        job.wait(since, timeout=min(request.args.get('timeout', 30.0, type=float), MAX_LONG_POLL))
+    with Metrics.timed('Server', 'serialize'):
+        response = jsonify(job.to_dict())
+    Metrics.count_bytes('Server', 'written', response.content_length or 0)
+    return response
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    Return a finished beat detection job's results, as JSON or in a binary format chosen by
+    the ``format`` query parameter or the ``Accept`` header (application/x-npz, application/msgpack).
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id."}), 404
+    if job.status != 'completed':
+        return jsonify(job.to_dict(include_result=False)), 409
+    if not isinstance(job.result, dict) or 'results' not in job.result:
+        return jsonify(job.result)
+
+    import BeatFormats
+    try:
+        fmt = BeatFormats.negotiate(request.accept_mimetypes, request.args.get('format'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 406
+    metadata = {key: value for key, value in job.result.items() if key != 'results'}
+    with Metrics.timed('Server', f'serialize_{fmt}'):
+        payload, mimetype = BeatFormats.encode_results(job.result['results'], fmt, metadata)
+    Metrics.count_bytes('Server', 'written', len(payload))
+    return Response(payload, mimetype=mimetype)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id."}), 404
+    logging.info(f"Cancelled job {job_id}.")
+    return jsonify(job.to_dict(include_result=False))
+
+@app.route('/peaks', methods=['GET'])
+def peaks():
+    """
+    Return min/max waveform peaks of an audio file at the pyramid level matching the ``width``
+    in pixels the whole file is drawn across, as interleaved int8 values scaled by 127. The
+    level is described by ``X-Peaks-*`` headers. If the pyramid has not been built yet, a
+    ``peaks`` job is queued to build it and its status is returned with 202; request the peaks
+    again once it completes.
+    """
+    file_path = request.args.get('file_path')
+    if not file_path:
+        return jsonify({"error": "file_path is required."}), 400
+    if not os.path.isfile(file_path):
+        return jsonify({"error": f"File not found: {file_path}"}), 404
+    width = request.args.get('width', 2000, type=int)
+    if width is None or width <= 0:
+        return jsonify({"error": f"Invalid width: {request.args.get('width')}. Must be a positive integer."}), 400
+
+    builder = get_waveform_peaks()
+    if not builder.is_ready(file_path):
+        # Decoding and reducing a long file must not hold a request thread.
+        return submit_job(run_peaks, 'peaks', {"file_path": file_path, "priority": request.args.get('priority', 1)})
+    try:
+        data = builder.peaks_for_width(file_path, width)
+    except Exception as e:
+        logging.error(f"Error reading peaks for {file_path}: {e}")
+        return jsonify({"error": str(e)}), 500
+    with Metrics.timed('Server', 'serialize_peaks'):
+        payload = data["peaks"].tobytes()
+    headers = {"X-Peaks-Duration": repr(data["duration"]), "X-Peaks-Sample-Rate": str(data["sample_rate"]),
+               "X-Peaks-Samples-Per-Peak": str(data["samples_per_peak"]), "X-Peaks-Level": str(data["level"]),
+               "X-Peaks-Scale": "127"}
+    Metrics.count_bytes('Server', 'written', len(payload))
+    return Response(payload, mimetype='application/octet-stream', headers=headers)
 
 @app.route('/isolate', methods=['POST'])
 def isolate():
     logging.info("Isolating audio...")
-    global progress
-    progress = 0
     data = request.json
     logging.debug(f"Request data: {data}")
-    
-    try:
-        isolator = AudioIsolation.Isolator(data['file_path'])
-        logging.info("Isolator created.")
-        model_name = data.get('model_name', 'htdemucs')
-        device = data.get('device', 'cuda')
-        shifts = data.get('shifts', 0)
-        two_stems = data.get('two_stems', None)
-        output_folder = data.get('output_folder', 'output')
-        
-        output_files = isolator.process_audio(model_name=model_name, device=device, shifts=shifts, two_stems=two_stems, output_folder=output_folder)
-        progress = 100
-        logging.info("Isolation complete.")
-        return jsonify({"message": "Isolation complete.", "output_files": output_files})
-    except Exception as e:
-        logging.error(f"Error during isolation: {e}")
-        return jsonify({"error": str(e)}), 500
+    return submit_job(run_isolation, 'isolate', data)
 
 @app.route('/beat-detection', methods=['POST'])
 def beat_detection():
     logging.info("Detecting beats...")
-    global progress
-    progress = 0
     data = request.json
     logging.debug(f"Request data: {data}")
-    
+    return submit_job(run_beat_detection, 'beat-detection', data)
+
+@app.route('/beat-detection/sweep', methods=['POST'])
+def beat_sweep():
+    logging.info("Sweeping beat detection parameters...")
+    data = request.json
+    logging.debug(f"Request data: {data}")
+    return submit_job(run_beat_sweep, 'beat-sweep', data)
+
+@app.route('/beat-detection/batch', methods=['POST'])
+def batch_beat_detection():
+    logging.info("Detecting beats in batch...")
+    data = request.json
+    logging.debug(f"Request data: {data}")
+    if data and (not isinstance(data.get('file_paths'), list) or not data['file_paths']):
+        return jsonify({"error": "file_paths must be a non-empty list."}), 400
+    return submit_job(run_batch_beat_detection, 'beat-detection-batch', data, required='file_paths')
+
+SERVER_HOST = os.environ.get('SOUNDBUDDY_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('SOUNDBUDDY_PORT', 5000))
+# Progress streams and long polls each hold a thread while they wait for job events.
+SERVER_THREADS = int(os.environ.get('SOUNDBUDDY_SERVER_THREADS', 32))
+
+
+def serve():
+    """
+    Serve the app with waitress, a multi-threaded production WSGI server, or with the Werkzeug
+    development server and its reloader when ``SOUNDBUDDY_DEBUG`` is set.
+
+    Jobs, caches and warm models live in this process, so the server runs one process with many
+    threads rather than several worker processes.
+    """
+    if os.environ.get('SOUNDBUDDY_DEBUG'):
+        app.run(host=SERVER_HOST, port=SERVER_PORT, debug=True)
+        return
     try:
-        hop_length = data.get('hop_length', 512)
-        sr = data.get('sr', 22050)
-        start_bpm = data.get('start_bpm', 120)
-        tightness = data.get('tightness', 100.0)
-        beat_rec = BeatDetection.BeatTracker(audio_files=[data['file_path']],
-                                       hop_length=hop_length, 
-                                       sr=sr, start_bpm=start_bpm,
-                                       tightness=tightness)
-        results = beat_rec.track_beats()
-        progress = 100
-        logging.info("Beat detection completed.")
-        return jsonify({"message": "Beat detection completed successfully.", "results": results})
-    except Exception as e:
-        logging.error(f"Error during beat detection: {e}")
-        return jsonify({"error": str(e)}), 500
+        import waitress
+    except ImportError:
+        logging.warning("waitress is not installed; falling back to the threaded development server.")
+        app.run(host=SERVER_HOST, port=SERVER_PORT, threaded=True)
+        return
+    logging.info(f"Serving on http://{SERVER_HOST}:{SERVER_PORT} with {SERVER_THREADS} threads.")
+    waitress.serve(app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS)
+
+if IS_SERVER_PROCESS:
+    start_warm_up()
 
 if __name__ == '__main__':
     try:
@@ -78,6 +600,6 @@ if __name__ == '__main__':
     except Exception as e:
         logging.error(f"Error during initialization: {e}")
         sys.exit(1)
-    
+
     logging.info("Starting server...")
-    app.run(debug=True)
+    serve()
@@ -0,0 +1,186 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+import Metrics
+from ResultCache import content_hash
+
+
+class WaveformPeaks:
+    """
+    Multi-resolution min/max peak pyramid of audio files, for drawing waveforms in the panel.
+
+    The finest level holds the minimum and maximum sample (across all channels) of every
+    ``base_samples`` samples, computed block by block with array reductions over the decoded
+    buffer from the ``AudioStore``. Each coarser level merges ``factor`` peaks of the level
+    below, down to about ``min_peaks`` peaks, so the whole pyramid costs one pass over the
+    audio and about a third more than the finest level. Pyramids are saved as
+    ``<hash>.peaks.npz`` next to the decoded audio and recently used ones are kept in memory.
+    Levels are served quantised to int8, which is plenty for drawing and a quarter the size.
+
+    Attributes:
+        audio_store (AudioStore): Store the audio is read from and the pyramids are saved next to.
+        base_samples (int): Samples per peak at the finest level.
+        factor (int): Ratio between the samples per peak of neighbouring levels.
+        min_peaks (int): Peak count below which no coarser level is built.
+        max_entries (int): Number of pyramids kept in memory.
+    """
+
+    def __init__(self, audio_store, base_samples: int = 256, factor: int = 4, min_peaks: int = 512,
+                 max_entries: int = 16):
+        self.audio_store = audio_store
+        self.base_samples = base_samples
+        self.factor = factor
+        self.min_peaks = min_peaks
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.validate_parameters()
+
+    def validate_parameters(self):
+        """
+        Validate the pyramid configuration.
+
+        Raises:
+            ValueError: If any parameter is invalid.
+        """
+        for name in ('base_samples', 'min_peaks', 'max_entries'):
+            value = getattr(self, name)
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(f"Invalid {name}: {value}. Must be a positive integer.")
+
+        if not isinstance(self.factor, int) or self.factor < 2:
+            raise ValueError(f"Invalid factor: {self.factor}. Must be an integer of at least 2.")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.audio_store.store_dir, f"{key}.peaks.npz")
+
+    def is_ready(self, file_path: str) -> bool:
+        """
+        Return whether the pyramid of a file is in memory or on disk, so serving it needs no decode.
+        """
+        key = content_hash(file_path)
+        with self._lock:
+            if key in self._entries:
+                return True
+        return os.path.exists(self._path(key))
+
+    def compute(self, y: np.ndarray, block_peaks: int = 1 << 14) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Build the pyramid of a ``(channels, samples)`` buffer.
+
+        Args:
+            y (np.ndarray): Audio buffer, possibly memory-mapped.
+            block_peaks (int): Number of finest-level peaks reduced per block, which bounds memory use.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: ``(min, max)`` float32 arrays per level, finest first.
+        """
+        y = np.atleast_2d(y)
+        channels, length = y.shape
+        base = self.base_samples
+        count = max(1, -(-length // base))
+        mins = np.zeros(count, dtype=np.float32)
+        maxs = np.zeros(count, dtype=np.float32)
+
+        block = base * block_peaks
+        for start in range(0, length, block):
+            chunk = np.asarray(y[:, start:start + block], dtype=np.float32)
+            pad = -chunk.shape[1] % base
+            if pad:
+                # Repeat the last sample so padding never widens the final peak.
+                chunk = np.pad(chunk, ((0, 0), (0, pad)), mode='edge')
+            frames = chunk.reshape(channels, -1, base)
+            index = start // base
+            mins[index:index + frames.shape[1]] = frames.min(axis=(0, 2))
+            maxs[index:index + frames.shape[1]] = frames.max(axis=(0, 2))
+
+        levels = [(mins, maxs)]
+        while levels[-1][0].size > self.min_peaks:
+            low, high = levels[-1]
+            pad = -low.size % self.factor
+            if pad:
+                low = np.pad(low, (0, pad), mode='edge')
+                high = np.pad(high, (0, pad), mode='edge')
+            levels.append((low.reshape(-1, self.factor).min(axis=1), high.reshape(-1, self.factor).max(axis=1)))
+        return levels
+
+    def pyramid(self, file_path: str) -> Dict[str, np.ndarray]:
+        """
+        Return the pyramid of a file, computing and saving it on first use.
+
+        Args:
+            file_path (str): Path to the audio file.
+
+        Returns:
+            Dict[str, np.ndarray]: ``sr``, ``length``, ``samples_per_peak`` per level and ``min_<i>``/``max_<i>`` arrays.
+        """
+        key = content_hash(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                Metrics.count_cache('waveform_peaks', True)
+                return entry
+
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+            Metrics.count_cache('waveform_peaks', True)
+        except (OSError, ValueError):
+            Metrics.count_cache('waveform_peaks', False)
+            y = self.audio_store.load(file_path)
+            sr = self.audio_store.native_sr(file_path)
+            with Metrics.timed('WaveformPeaks', 'compute'):
+                levels = self.compute(y)
+            entry = {"sr": np.array(sr), "length": np.array(y.shape[-1]),
+                     "samples_per_peak": np.array([self.base_samples * self.factor ** i for i in range(len(levels))])}
+            for index, (low, high) in enumerate(levels):
+                entry[f"min_{index}"] = low
+                entry[f"max_{index}"] = high
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp_path, **entry)
+            os.replace(tmp_path, path)
+            self.audio_store.evict(keep=key)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def peaks_for_width(self, file_path: str, width: int) -> Dict[str, Any]:
+        """
+        Return the coarsest level with at least ``width`` peaks, or the finest level if none has that many.
+
+        Args:
+            file_path (str): Path to the audio file.
+            width (int): Number of pixels the whole file is drawn across.
+
+        Returns:
+            Dict[str, Any]: ``duration``, ``sample_rate``, ``samples_per_peak``, ``level`` and ``peaks``,
+            the interleaved ``[min, max, min, max, ...]`` values of the level as int8 scaled by 127.
+        """
+        entry = self.pyramid(file_path)
+        samples_per_peak = entry["samples_per_peak"]
+        level = 0
+        for index in range(len(samples_per_peak) - 1, -1, -1):
+            if entry[f"min_{index}"].size >= width:
+                level = index
+                break
+
+        low, high = entry[f"min_{level}"], entry[f"max_{level}"]
+        # Rounded outwards so quantisation never shrinks a peak.
+        peaks = np.empty(low.size * 2, dtype=np.float32)
+        peaks[0::2] = np.floor(low * 127)
+        peaks[1::2] = np.ceil(high * 127)
+        sr = int(entry["sr"])
+        return {"duration": int(entry["length"]) / sr, "sample_rate": sr,
+                "samples_per_peak": int(samples_per_peak[level]), "level": level,
+                "peaks": np.clip(peaks, -127, 127).astype(np.int8)}
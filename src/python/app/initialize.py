@@ -1,3 +1,4 @@
+import importlib.util
 import logging
 import subprocess
 import sys
@@ -6,14 +7,14 @@ import sys
 logging.basicConfig(filename='initialize.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s:%(message)s')
 
 def check_installed_packages():
+    # Probe with find_spec rather than importing, so the check does not pay for loading the packages.
     try:
-        import flask
-        import librosa
-        import scipy
-        try:
-            import demucs
+        for package in ('flask', 'librosa', 'scipy'):
+            if importlib.util.find_spec(package) is None:
+                raise ImportError(f"No module named '{package}'")
+        if importlib.util.find_spec('demucs') is not None:
             logging.info("demucs is already installed.")
-        except ImportError:
+        else:
             subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-U', 'git+https://github.com/facebookresearch/demucs#egg=demucs'])
             # pip install -U 'git+https://github.com/facebookresearch/demucs#egg=demucs' 
             logging.info("demucs installed successfully.")
@@ -26,7 +27,7 @@ def check_installed_packages():
 if __name__ == '__main__':
     if check_installed_packages():
         logging.info("Starting server...")
-        from Server import app  # Ensure this import is done after installations
-        app.run(debug=True)
+        from Server import serve  # Ensure this import is done after installations
+        serve()
     else:
         logging.error("Required packages are missing. Please check the installation.")
@@ -0,0 +1,89 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+import soundfile as sf
+
+
+def click_track(bpm: float, duration: float, sr: int = 44100, click_length: float = 0.01) -> np.ndarray:
+    """
+    Generate a mono click track with a click on every beat.
+
+    Args:
+        bpm (float): Tempo of the clicks.
+        duration (float): Length of the track in seconds.
+        sr (int): Sample rate.
+        click_length (float): Length of each click in seconds.
+
+    Returns:
+        np.ndarray: Float32 samples.
+    """
+    y = np.zeros(int(duration * sr), dtype=np.float32)
+    n_click = int(click_length * sr)
+    t = np.arange(n_click) / sr
+    click = (np.sin(2 * np.pi * 1000 * t) * np.exp(-t * 400)).astype(np.float32)
+    for beat_time in click_times(bpm, duration):
+        start = int(beat_time * sr)
+        end = min(start + n_click, len(y))
+        y[start:end] += click[:end - start]
+    return y
+
+
+def click_times(bpm: float, duration: float) -> np.ndarray:
+    return np.arange(0.0, duration, 60.0 / bpm)
+
+
+def noise_tone_mix(duration: float, sr: int = 44100, seed: int = 0) -> np.ndarray:
+    """
+    Generate a stereo mix of pink-ish noise and slowly gliding tones.
+
+    Args:
+        duration (float): Length of the mix in seconds.
+        sr (int): Sample rate.
+        seed (int): Seed of the noise generator.
+
+    Returns:
+        np.ndarray: Float32 samples shaped ``(samples, 2)``.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+    noise = np.cumsum(rng.standard_normal((n, 2)), axis=0)
+    noise -= np.linspace(noise[0], noise[-1], n)
+    noise /= np.abs(noise).max() + 1e-9
+    tone = 0.3 * np.sin(2 * np.pi * (220 + 20 * np.sin(2 * np.pi * 0.05 * t)) * t)
+    mix = 0.2 * noise + np.stack([tone, np.roll(tone, sr // 100)], axis=1)
+    return (mix / np.abs(mix).max() * 0.8).astype(np.float32)
+
+
+def write_fixtures(folder: str, bpms: List[float] = (90.0, 120.0, 174.0), click_duration: float = 60.0,
+                   mix_duration: float = 180.0, sr: int = 44100) -> Dict[str, Dict[str, object]]:
+    """
+    Write the benchmark fixtures as WAV files, reusing ones that already exist.
+
+    Args:
+        folder (str): Folder to write the fixtures to.
+        bpms (List[float]): Tempos of the click tracks.
+        click_duration (float): Length of each click track in seconds.
+        mix_duration (float): Length of the noise-plus-tone mix in seconds.
+        sr (int): Sample rate.
+
+    Returns:
+        Dict[str, Dict[str, object]]: Fixture metadata by name, including ``path`` and, for
+        click tracks, the ground-truth ``bpm`` and ``beat_times``.
+    """
+    os.makedirs(folder, exist_ok=True)
+    fixtures = {}
+    for bpm in bpms:
+        name = f"click_{int(bpm)}bpm"
+        path = os.path.join(folder, f"{name}_{int(click_duration)}s.wav")
+        if not os.path.exists(path):
+            sf.write(path, click_track(bpm, click_duration, sr), sr, subtype='FLOAT')
+        fixtures[name] = {"path": path, "bpm": bpm, "duration": click_duration,
+                          "beat_times": click_times(bpm, click_duration).tolist()}
+
+    path = os.path.join(folder, f"noise_tone_{int(mix_duration)}s.wav")
+    if not os.path.exists(path):
+        sf.write(path, noise_tone_mix(mix_duration, sr), sr, subtype='FLOAT')
+    fixtures["noise_tone"] = {"path": path, "duration": mix_duration}
+    return fixtures
@@ -0,0 +1,332 @@
+"""
+Reproducible benchmarks for beat tracking, audio decoding and the Flask endpoints.
+
+Fixtures are generated on first run (click tracks at known tempos and a multi-minute
+noise-plus-tone mix). Every case runs in a fresh process so its peak RSS can be measured
+in isolation, and the results are written as JSON. Timed repeats follow an untimed warm-up
+call, so numba compilation only shows up in the metrics labelled cold or first. Pass
+``--compare`` with an earlier results file to flag latency regressions; the exit code is 1
+if any are found.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--repeat N] [--only NAME ...]
+                                        [--output FILE] [--compare FILE] [--threshold 0.2]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'app')
+# A numba cache of the benchmarks' own, inherited by the case processes, so JIT state does not
+# depend on what the server compiled before and runs stay comparable.
+os.environ['NUMBA_CACHE_DIR'] = os.path.join(BENCH_DIR, 'numba_cache')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def timed(fn: Callable[[], object], repeat: int, warm_up: bool = True) -> List[float]:
+    # The untimed first call absorbs numba JIT compilation and other one-off setup.
+    if warm_up:
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def beat_f_measure(estimated: List[float], reference: List[float], tolerance: float = 0.07) -> float:
+    """
+    F-measure of estimated beats against reference beats within a tolerance window.
+    Estimated times are aligned to the reference by their median offset first, since
+    trimming shifts the time origin.
+    """
+    if not estimated or not reference:
+        return 0.0
+    import numpy as np
+    estimated = np.asarray(estimated)
+    reference = np.asarray(reference)
+    nearest = reference[np.abs(reference[None, :] - estimated[:, None]).argmin(axis=1)]
+    estimated = estimated + np.median(nearest - estimated)
+    matched = set()
+    hits = 0
+    for time_ in estimated:
+        index = int(np.abs(reference - time_).argmin())
+        if index not in matched and abs(reference[index] - time_) <= tolerance:
+            matched.add(index)
+            hits += 1
+    precision = hits / len(estimated)
+    recall = hits / len(reference)
+    return 0.0 if hits == 0 else 2 * precision * recall / (precision + recall)
+
+
+# Benchmark cases. Each runs in its own process and returns its metrics.
+
+def case_beat_track(fixture: Dict[str, object], repeat: int) -> Dict[str, object]:
+    import BeatDetection
+    results = []
+    latencies = timed(lambda: results.append(BeatDetection.BeatTracker(audio_files=[fixture["path"]]).track_beats()),
+                      repeat)
+    metrics = {"latency_s": latencies, "audio_seconds": fixture["duration"]}
+    if "beat_times" in fixture:
+        metrics["f_measure"] = beat_f_measure(results[-1][0]["beat_times"], fixture["beat_times"])
+    return metrics
+
+
+def case_beat_track_streaming(fixture: Dict[str, object], repeat: int) -> Dict[str, object]:
+    import BeatDetection
+    results = []
+    latencies = timed(lambda: results.append(
+        BeatDetection.BeatTracker(audio_files=[fixture["path"]]).track_beats_streaming()), repeat)
+    metrics = {"latency_s": latencies, "audio_seconds": fixture["duration"]}
+    if "beat_times" in fixture:
+        metrics["f_measure"] = beat_f_measure(results[-1][0]["beat_times"], fixture["beat_times"])
+    return metrics
+
+
+def case_beat_retrack(fixture: Dict[str, object], repeat: int) -> Dict[str, object]:
+    import BeatDetection
+    import FeatureCache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        tracker = BeatDetection.BeatTracker(feature_cache=FeatureCache.FeatureCache(cache_dir))
+        first = timed(lambda: tracker.compute_features(fixture["path"]), 1, warm_up=False)[0]
+        features = tracker.compute_features(fixture["path"])
+        latencies = timed(lambda: tracker.track_features(features, tightness=400.0, start_bpm=100.0), repeat)
+    return {"latency_s": latencies, "features_latency_s": first, "audio_seconds": fixture["duration"]}
+
+
+def case_audio_decode(fixture: Dict[str, object], repeat: int) -> Dict[str, object]:
+    import AudioIsolation
+    import AudioStore
+    latencies = []
+    with tempfile.TemporaryDirectory() as store_dir:
+        for _ in range(repeat):
+            store = AudioStore.AudioStore(os.path.join(store_dir, str(len(latencies))))
+            start = time.perf_counter()
+            isolator = AudioIsolation.Isolator(fixture["path"], audio_store=store)
+            store.load(isolator.audio_file, sr=44100)
+            latencies.append(time.perf_counter() - start)
+        warm = timed(lambda: store.load(fixture["path"], sr=44100), repeat)
+    return {"latency_s": latencies, "warm_latency_s": warm, "audio_seconds": fixture["duration"]}
+
+
+class StandInEngine:
+    """
+    Local stand-in for the Demucs engine: writes scaled copies of the input as stems, so the
+    endpoint benchmarks measure everything around separation without needing model weights.
+    """
+
+    SOURCES = ('drums', 'bass', 'other', 'vocals')
+
+    def loaded_models(self) -> List[str]:
+        return []
+
+    def separate_file(self, file_path, model_name, output_folder, shifts=0, two_stems=None, audio_store=None,
+                      progress_callback=None, **kwargs):
+        import numpy as np
+        import soundfile as sf
+        report = progress_callback or (lambda stage, fraction: None)
+        report('decode', 0.0)
+        y = np.asarray(audio_store.load(file_path, sr=44100)) if audio_store else sf.read(file_path)[0].T
+        report('separate', 0.1)
+        track_folder = os.path.join(output_folder, model_name, os.path.splitext(os.path.basename(file_path))[0])
+        os.makedirs(track_folder, exist_ok=True)
+        output_files = []
+        names = (two_stems, f"no_{two_stems}") if two_stems else self.SOURCES
+        for index, name in enumerate(names):
+            report('write', 0.9 + 0.1 * index / len(names))
+            path = os.path.join(track_folder, f"{name}.wav")
+            sf.write(path, (y / len(names)).T, 44100)
+            output_files.append(path)
+        return output_files
+
+
+def _run_server_job(client, route: str, payload: Dict[str, object]) -> Dict[str, object]:
+    response = client.post(route, json=payload)
+    job_id = response.get_json()["job_id"]
+    while True:
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["status"] in ('completed', 'failed', 'cancelled'):
+            if job["status"] != 'completed':
+                raise RuntimeError(f"{route} job {job['status']}: {job.get('error')}")
+            return job
+        time.sleep(0.005)
+
+
+def case_server(fixture: Dict[str, object], repeat: int, route: str) -> Dict[str, object]:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ['SOUNDBUDDY_CACHE_DIR'] = os.path.join(scratch, 'cache')
+        os.environ['SOUNDBUDDY_AUDIO_STORE_DIR'] = os.path.join(scratch, 'audio_store')
+        os.environ['SOUNDBUDDY_FEATURE_CACHE_DIR'] = os.path.join(scratch, 'feature_cache')
+        # server.log is written to the working directory.
+        os.chdir(scratch)
+        try:
+            metrics = _bench_server(fixture, repeat, route, scratch)
+        finally:
+            os.chdir(cwd)
+    return metrics
+
+
+def _bench_server(fixture: Dict[str, object], repeat: int, route: str, scratch: str) -> Dict[str, object]:
+    import Server
+    Server.get_separation_engine = lambda device: StandInEngine()
+    # Beat features would otherwise be reused across repeats, like a result cache hit.
+    Server.get_feature_cache = lambda: None
+    client = Server.app.test_client()
+
+    payload = {"file_path": fixture["path"], "output_folder": os.path.join(scratch, 'output'), "device": 'cpu'}
+    start = time.perf_counter()
+    _run_server_job(client, route, payload)
+    cold = time.perf_counter() - start
+
+    # ``latency_s`` is the uncached request: the result cache is emptied before every repeat,
+    # so only the decoded audio store stays warm. Cache hits are timed separately.
+    latencies = []
+    for _ in range(repeat):
+        Server.result_cache.clear()
+        start = time.perf_counter()
+        _run_server_job(client, route, payload)
+        latencies.append(time.perf_counter() - start)
+    cached = timed(lambda: _run_server_job(client, route, payload), repeat)
+    response_bytes = len(client.get('/jobs').data)
+    return {"latency_s": latencies, "cold_latency_s": cold, "cached_latency_s": cached,
+            "cached_latency_median_s": statistics.median(cached), "audio_seconds": fixture["duration"],
+            "jobs_listing_bytes": response_bytes}
+
+
+CASES = {
+    "beat_track": (case_beat_track, ["click_90bpm", "click_120bpm", "click_174bpm", "noise_tone"], {}),
+    "beat_track_streaming": (case_beat_track_streaming, ["click_120bpm", "noise_tone"], {}),
+    "beat_retrack": (case_beat_retrack, ["noise_tone"], {}),
+    "audio_decode": (case_audio_decode, ["noise_tone"], {}),
+    "server_isolate": (case_server, ["click_120bpm"], {"route": '/isolate'}),
+    "server_beat_detection": (case_server, ["click_120bpm"], {"route": '/beat-detection'}),
+}
+
+
+def _run_case(name: str, fixture: Dict[str, object], repeat: int) -> Dict[str, object]:
+    sys.path.insert(0, APP_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    fn, _, kwargs = CASES[name]
+    metrics = fn(fixture, repeat, **kwargs)
+    metrics["peak_rss_bytes"] = peak_rss_bytes()
+    return metrics
+
+
+def summarise(metrics: Dict[str, object]) -> Dict[str, object]:
+    latencies = metrics["latency_s"]
+    median = statistics.median(latencies)
+    metrics["latency_median_s"] = median
+    metrics["latency_min_s"] = min(latencies)
+    if metrics.get("audio_seconds") and median > 0:
+        metrics["realtime_factor"] = metrics["audio_seconds"] / median
+    return metrics
+
+
+def environment() -> Dict[str, object]:
+    versions = {}
+    for package in ('numpy', 'librosa', 'numba', 'scipy', 'flask', 'torch', 'demucs'):
+        try:
+            versions[package] = __import__(package).__version__
+        except Exception:
+            versions[package] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "commit": commit, "packages": versions}
+
+
+def compare(results: Dict[str, object], baseline_path: str, threshold: float) -> List[str]:
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for key, metrics in results.items():
+        if key not in baseline or "error" in metrics or "error" in baseline[key]:
+            continue
+        before = baseline[key]["latency_median_s"]
+        after = metrics["latency_median_s"]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append(f"{key}: {before:.4f}s -> {after:.4f}s (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=os.path.join(BENCH_DIR, 'fixtures'), help="Folder for generated fixtures.")
+    parser.add_argument('--output', default=None, help="Results file. Defaults to benchmarks/results/<timestamp>.json.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed repetitions per case.")
+    parser.add_argument('--quick', action='store_true', help="Use short fixtures for a fast smoke run.")
+    parser.add_argument('--only', nargs='*', default=None, choices=sorted(CASES), help="Cases to run.")
+    parser.add_argument('--compare', default=None, help="Earlier results file to check for regressions.")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative slowdown before flagging.")
+    args = parser.parse_args()
+
+    import fixtures as fixture_module
+    if args.quick:
+        fixtures = fixture_module.write_fixtures(os.path.join(args.fixtures, 'quick'), click_duration=15.0,
+                                                 mix_duration=30.0)
+    else:
+        fixtures = fixture_module.write_fixtures(args.fixtures)
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in args.only or CASES:
+        for fixture_name in CASES[name][1]:
+            key = f"{name}[{fixture_name}]"
+            print(f"Running {key}...", flush=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    metrics = executor.submit(_run_case, name, fixtures[fixture_name], args.repeat).result()
+                    results[key] = summarise(metrics)
+                    print(f"  median {results[key]['latency_median_s']:.4f}s, "
+                          f"peak RSS {(results[key]['peak_rss_bytes'] or 0) / 1024 ** 2:.0f} MiB")
+                except Exception as e:
+                    results[key] = {"error": str(e)}
+                    print(f"  failed: {e}")
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({"created": time.time(), "quick": args.quick, "repeat": args.repeat,
+                   "environment": environment(), "results": results}, f, indent=2)
+    print(f"Saved benchmark results to {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
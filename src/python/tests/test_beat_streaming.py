@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+try:
+    import numpy as np
+    import BeatDetection
+except ImportError:
+    BeatDetection = None
+
+SR = 22050
+SECONDS = 600
+BLOCK = 1 << 16
+
+
+def click_blocks(consumed):
+    # A 120 bpm click track, produced block by block like ``AudioDecoder.stream``.
+    total = SR * SECONDS
+    for start in range(0, total, BLOCK):
+        block = np.zeros(min(BLOCK, total - start), dtype=np.float32)
+        first = -(-start // (SR // 2)) * (SR // 2)
+        for click in range(first, start + block.size, SR // 2):
+            block[click - start:click - start + 64] = 1.0
+        consumed.append(block.size)
+        yield block[None]
+
+
+@unittest.skipIf(BeatDetection is None, "numpy and librosa are required")
+class StreamingBeatsTest(unittest.TestCase):
+
+    def _first_window(self, audio_store=None):
+        consumed = []
+        with mock.patch.object(BeatDetection.AudioDecoder, 'find_ffmpeg', return_value='ffmpeg'), \
+                mock.patch.object(BeatDetection.AudioDecoder, 'probe', return_value=(SR, 2, float(SECONDS))), \
+                mock.patch.object(BeatDetection.AudioDecoder, 'stream',
+                                  side_effect=lambda *args, **kwargs: click_blocks(consumed)):
+            tracker = BeatDetection.BeatTracker(sr=SR, audio_store=audio_store)
+            windows = tracker.iter_beats_streaming('track.m4a')
+            window = next(windows)
+            windows.close()
+        return window, sum(consumed)
+
+    def test_first_window_before_decode_ends(self):
+        window, decoded = self._first_window()
+        self.assertTrue(window["beat_times"])
+        self.assertLess(decoded, SR * SECONDS // 4)
+
+    def test_store_without_buffer_is_not_decoded_whole(self):
+        store = mock.Mock()
+        store.load_stored.return_value = None
+        window, decoded = self._first_window(store)
+        self.assertTrue(window["beat_times"])
+        self.assertLess(decoded, SR * SECONDS // 4)
+        store.load.assert_not_called()
+        store.native_sr.assert_not_called()
+
+    def test_stored_buffer_is_downmixed_per_block(self):
+        stereo = np.concatenate([block for block in click_blocks([])], axis=1).repeat(2, axis=0)
+        store = mock.Mock()
+        store.load_stored.return_value = (stereo, SR)
+        tracker = BeatDetection.BeatTracker(sr=SR, audio_store=store)
+        window = next(tracker.iter_beats_streaming('track.wav'))
+        self.assertTrue(window["beat_times"])
+        store.load.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()